@@ -0,0 +1,133 @@
+# analytics.py
+#
+# Queries behind the /analytics endpoints. Every predicate is a plain range
+# on an indexed column (never a function of it), so the planner can use the
+# indexes declared in models.py. tests/test_analytics_plans.py checks the
+# plans on a seeded Postgres database.
+
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Callable, List, Tuple
+
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from cache import MISSING, TTLCache
+from models import DailyItemSales
+
+# Results for ranges that ended before today (UTC) change only through batch
+# syncs with old timestamps and rollup rebuilds. Those drop the cache of the
+# worker that handled them; other workers' entries expire after
+# ANALYTICS_PAST_CACHE_TTL. Ranges that include today expire after
+# ANALYTICS_CACHE_TTL and are dropped when an order commits.
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "60"))
+ANALYTICS_PAST_CACHE_TTL = float(os.getenv("ANALYTICS_PAST_CACHE_TTL", "600"))
+
+past_results = TTLCache(ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_PAST_CACHE_TTL)
+live_results = TTLCache(ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+
+
+def day_bounds(start: date, end: date) -> Tuple[datetime, datetime]:
+    """Half-open timestamp range [start 00:00, end+1 00:00) covering both days."""
+    return datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+
+
+def month_range(year: int, month: int) -> Tuple[date, date]:
+    """First and last day of a month."""
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return first, following - timedelta(days=1)
+
+
+def revenue_stmt(start: date, end: date):
+    return select(
+        func.coalesce(func.sum(DailyItemSales.revenue), 0),
+        func.coalesce(func.sum(DailyItemSales.ingredient_cost), 0),
+    ).where(DailyItemSales.sales_date >= start, DailyItemSales.sales_date <= end)
+
+
+def popular_stmt(year: int, month: int, k: int):
+    first, last = month_range(year, month)
+    return (
+        select(
+            DailyItemSales.menu_item_name,
+            func.sum(DailyItemSales.quantity).label("sold"),
+        )
+        .where(DailyItemSales.sales_date >= first, DailyItemSales.sales_date <= last)
+        .group_by(DailyItemSales.menu_item_name)
+        .order_by(func.sum(DailyItemSales.quantity).desc())
+        .limit(k)
+    )
+
+
+def top_revenue_stmt(start: date, end: date, k: int):
+    return (
+        select(
+            DailyItemSales.menu_item_name,
+            func.sum(DailyItemSales.revenue).label("revenue"),
+        )
+        .where(DailyItemSales.sales_date >= start, DailyItemSales.sales_date <= end)
+        .group_by(DailyItemSales.menu_item_name)
+        .order_by(func.sum(DailyItemSales.revenue).desc())
+        .limit(k)
+    )
+
+
+async def cached(key: tuple, last_day: date, compute: Callable):
+    """Serve `key` from the result cache, awaiting compute() on a miss."""
+    cache = past_results if last_day < datetime.utcnow().date() else live_results
+    value = cache.get(key)
+    if value is MISSING:
+        generation = cache.generation
+        value = await compute()
+        cache.set(key, value, generation)
+    return value
+
+
+def invalidate_live():
+    """Called after an order commits: only ranges that include today changed."""
+    live_results.clear()
+
+
+def invalidate_all():
+    """Called when history changes (batch sync with old timestamps, rebuilds)."""
+    past_results.clear()
+    live_results.clear()
+
+
+def cache_stats() -> dict:
+    return {"past": past_results.stats(), "live": live_results.stats()}
+
+
+async def revenue_report(session: AsyncSession, start: date, end: date) -> dict:
+    async def compute():
+        income, cost = (await session.exec(revenue_stmt(start, end))).one()
+        # "revenue" has always been net of ingredient cost; the parts are
+        # reported alongside it
+        return {
+            "start": start,
+            "end": end,
+            "revenue": income - cost,
+            "sales": income,
+            "ingredient_cost": cost,
+            "margin": (income - cost) / income if income else None,
+        }
+
+    return await cached(("revenue", start.isoformat(), end.isoformat()), end, compute)
+
+
+async def top_k_popular(session: AsyncSession, year: int, month: int, k: int) -> List[dict]:
+    async def compute():
+        rows = (await session.exec(popular_stmt(year, month, k))).all()
+        return [{"name": r.menu_item_name, "sold": r.sold} for r in rows]
+
+    return await cached(("popular", year, month, k), month_range(year, month)[1], compute)
+
+
+async def top_k_revenue(session: AsyncSession, start: date, end: date, k: int) -> List[dict]:
+    async def compute():
+        rows = (await session.exec(top_revenue_stmt(start, end, k))).all()
+        return [{"name": r.menu_item_name, "revenue": r.revenue} for r in rows]
+
+    return await cached(("top-revenue", start.isoformat(), end.isoformat(), k), end, compute)
@@ -1,8 +1,10 @@
 # auth.py
 
+import asyncio
+import logging
 import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -10,38 +12,109 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlmodel import select
 
-from database import get_session
-from models import Manager, Employee
+from cache import MISSING, TTLCache
+from database import get_async_session
+from hashing import hash_pool
+from models import Manager, Employee, Principal
 
 # get these from your .env
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Changing BCRYPT_ROUNDS makes existing hashes "need update"; they are
+# rehashed at the new cost on the user's next successful login.
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS")
+_rounds = (
+    {"bcrypt__rounds": int(BCRYPT_ROUNDS),
+     "bcrypt__min_rounds": int(BCRYPT_ROUNDS),
+     "bcrypt__max_rounds": int(BCRYPT_ROUNDS)}
+    if BCRYPT_ROUNDS else {}
+)
+pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto", **_rounds)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+log = logging.getLogger("coffee.auth")
+
+# Resolved principals by token subject (email). update_employee and
+# delete_employee drop entries; the TTL bounds staleness across workers.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+
+# bcrypt runs on the bounded hash_pool (see hashing.py), which raises 503
+# when it is saturated.
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_ctx.verify(plain, hashed)
+    return hash_pool.run(pwd_ctx.verify, plain, hashed)
+
+
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Like verify_password, plus a new hash when the stored one uses outdated settings."""
+    return hash_pool.run(pwd_ctx.verify_and_update, plain, hashed)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_ctx.hash(password)
-
-
-def authenticate_user(email: str, password: str, session=Depends(get_session)) -> Optional[Employee]:
-    print("🔑 Attempting login for:", email)
-    user = session.exec(select(Employee).where(Employee.email == email)).first()
-    print("👤 Lookup result:", user)
-    if user:
-        ok = verify_password(password, user.password_hash)
-        print("🔒 Password match?", ok)
-    if not user or not ok:
-        print("❌ Authentication failed")
+    return hash_pool.run(pwd_ctx.hash, password)
+
+
+# async variants: the event loop awaits the pool instead of blocking on it
+
+async def verify_and_update_password_async(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return await asyncio.wrap_future(hash_pool.submit(pwd_ctx.verify_and_update, plain, hashed))
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.wrap_future(hash_pool.submit(pwd_ctx.hash, password))
+
+
+def _principal_query(*where):
+    return (
+        select(Employee, Manager.ssn)
+        .outerjoin(Manager, Manager.ssn == Employee.ssn)
+        .where(*where)
+    )
+
+
+def _to_principal(user: Employee, manager_ssn: Optional[str]) -> Principal:
+    return Principal(
+        ssn=user.ssn,
+        name=user.name,
+        email=user.email,
+        salary=user.salary,
+        role="manager" if manager_ssn else "barista",
+    )
+
+
+async def load_principal(session, email: str) -> Optional[Principal]:
+    """Employee and role in one query."""
+    row = (await session.exec(_principal_query(Employee.email == email))).first()
+    return _to_principal(*row) if row else None
+
+
+async def authenticate_user(email: str, password: str, session=Depends(get_async_session)) -> Optional[Principal]:
+    row = (await session.exec(_principal_query(Employee.email == email))).first()
+    if row:
+        ok, new_hash = await verify_and_update_password_async(password, row[0].password_hash)
+    if not row or not ok:
+        log.debug("login failed for %s", email)
         return None
-    print("✅ Authentication succeeded")
-    return user
+    log.debug("login succeeded for %s", email)
+    if new_hash:
+        row[0].password_hash = new_hash
+        session.add(row[0])
+        await session.commit()
+    principal = _to_principal(*row)
+    principal_cache.set(principal.email, principal)
+    return principal
+
+
+def invalidate_principal(*emails: str):
+    for email in emails:
+        if email:
+            principal_cache.pop(email)
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -52,10 +125,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
+def principal_token(principal: Principal) -> str:
+    """Access token carrying the ssn and role as claims next to the email subject."""
+    return create_access_token(
+        {"sub": principal.email, "ssn": principal.ssn, "role": principal.role}
+    )
+
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    session=Depends(get_session),
-) -> Employee:
+    session=Depends(get_async_session),
+) -> Principal:
+    """
+    Resolve the bearer token. A warm subject is served from principal_cache
+    without touching the database; FastAPI caches this dependency per
+    request, so routes that also declare protected() resolve it once.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -69,22 +154,24 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    stmt = select(Employee).where(Employee.email == email)
-    user = session.exec(stmt).first()
-    if not user:
+    principal = principal_cache.get(email)
+    if principal is MISSING:
+        generation = principal_cache.generation
+        principal = await load_principal(session, email)
+        if not principal:
+            raise credentials_exception
+        principal_cache.set(email, principal, generation)
+    # tokens issued before the claims existed carry no ssn
+    if payload.get("ssn", principal.ssn) != principal.ssn:
         raise credentials_exception
-    return user
-
-
-def require_manager_role(
-    current: Employee = Depends(get_current_user),
-    session = Depends(get_session)
-) -> Employee:
-    # check if current user exists as a manager
-    is_mgr = session.exec(
-        select(Manager).where(Manager.ssn == current.ssn)
-    ).first()
-    if not is_mgr:
+    return principal
+
+
+async def require_manager_role(
+    current: Principal = Depends(get_current_user),
+) -> Principal:
+    # the role was resolved together with the principal
+    if current.role != "manager":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Managers only"
@@ -0,0 +1,116 @@
+# bench_concurrency.py
+#
+# Closed-loop load generator for comparing builds of the backend, e.g. the
+# async stack against the previous sync one running on another port:
+#
+#     python bench_concurrency.py --email a@x --password pw \
+#         --base-url http://localhost:8000 --base-url http://localhost:8001
+#
+# One token is fetched per base URL up front and shared by all clients
+# (the login path is bcrypt-bound and would dominate). Every client loops
+# over the mixed workload below until the duration runs out. Orders are only
+# placed with --order ITEM (they change stock and the ledger, so point it at
+# a scratch database). With --orders-only every request is an order, e.g. to
+# compare ORDER_WRITE_MODE=direct and =group servers in orders/sec.
+
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+import httpx
+
+LEVELS = (50, 200, 1000)
+READS = ("/me", "/menu_items?limit=50", "/orders?limit=50", "/analytics/revenue/?start={today}&end={today}")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[i]
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    r = await client.post("/token", data={"username": email, "password": password})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def worker(client: httpx.AsyncClient, paths: List[str], order: Optional[str],
+                 deadline: float, latencies: List[float], errors: List[int]):
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if order and (not paths or i % len(paths) == 0):
+                r = await client.post("/orders/", json={
+                    "payment_method": "cash",
+                    "items": [{"menu_item_name": order, "quantity": 1}],
+                })
+            else:
+                r = await client.get(paths[i % len(paths)])
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        latencies.append(time.perf_counter() - started)
+        i += 1
+
+
+async def run_level(base_url: str, token: str, clients: int, duration: float,
+                    order: Optional[str], orders_only: bool = False) -> dict:
+    today = time.strftime("%Y-%m-%d")
+    paths = [] if orders_only else [p.format(today=today) for p in READS]
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    latencies: List[float] = []
+    errors: List[int] = []
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, paths[i % len(paths):] + paths[:i % len(paths)] if paths else [], order,
+                   deadline, latencies, errors)
+            for i in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def main(args):
+    print(f"{'base url':<28} {'clients':>7} {'requests':>9} {'errors':>7} "
+          f"{'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for base_url in args.base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+            token = await login(client, args.email, args.password)
+        for clients in args.clients:
+            s = await run_level(base_url, token, clients, args.duration, args.order, args.orders_only)
+            print(f"{base_url:<28} {s['clients']:>7} {s['requests']:>9} {s['errors']:>7} "
+                  f"{s['rps']:>9.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent client benchmark")
+    parser.add_argument("--base-url", action="append", required=True,
+                        help="repeat to compare several running builds")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--clients", type=int, nargs="+", default=list(LEVELS))
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    parser.add_argument("--order", help="menu item to order once per client loop")
+    parser.add_argument("--orders-only", action="store_true",
+                        help="post only orders (requires --order); rps is then orders/sec")
+    args = parser.parse_args()
+    if args.orders_only and not args.order:
+        parser.error("--orders-only requires --order")
+    asyncio.run(main(args))
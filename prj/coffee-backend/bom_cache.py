@@ -0,0 +1,113 @@
+# bom_cache.py
+
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from sqlmodel import Session, select
+
+from models import Recipe, RecipeIngredient
+
+# seconds before a cached BOM is re-read, so recipe edits made through
+# another worker (or outside the app) are picked up
+BOM_CACHE_TTL = float(os.getenv("BOM_CACHE_TTL", "60"))
+
+
+class BomLine(NamedTuple):
+    inventory_item_name: str
+    quantity: float   # per unit of the menu item
+
+
+# None means "menu item has no recipe"
+Bom = Optional[Tuple[BomLine, ...]]
+
+
+class BomCache:
+    """
+    Process-local bill of materials per menu item name.
+
+    Entries are dropped by the write endpoints that change recipes, menu
+    items or ingredients (see invalidate_*). Ingredient prices are not
+    cached: orders read them with the stock update. Each worker process keeps
+    its own copy, so edits made through another worker or outside the app
+    are seen once the entry is older than BOM_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl: float = BOM_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._boms: Dict[str, Tuple[float, Bom]] = {}  # name -> (expires, bom)
+        # inventory item -> menu items whose cached BOM uses it
+        self._used_by: Dict[str, Set[str]] = defaultdict(set)
+        # bumped on every invalidation so a load that raced a write is not stored
+        self._generation = 0
+
+    def get_many(self, session: Session, names: Iterable[str]) -> Dict[str, Bom]:
+        names = list(names)
+        now = time.monotonic()
+        with self._lock:
+            found = {n: self._boms[n][1] for n in names if n in self._boms and self._boms[n][0] > now}
+            generation = self._generation
+        missing = [n for n in names if n not in found]
+        if missing:
+            loaded = self._load(session, missing)
+            with self._lock:
+                if generation == self._generation:
+                    for name, bom in loaded.items():
+                        self._store(name, bom)
+            found.update(loaded)
+        return found
+
+    def get(self, session: Session, name: str) -> Bom:
+        return self.get_many(session, [name])[name]
+
+    def _load(self, session: Session, names) -> Dict[str, Bom]:
+        rows = session.exec(
+            select(
+                Recipe.menu_item_name,
+                RecipeIngredient.inventory_item_name,
+                RecipeIngredient.quantity,
+            )
+            .outerjoin(RecipeIngredient, RecipeIngredient.recipe_id == Recipe.recipe_id)
+            .where(Recipe.menu_item_name.in_(names))
+        ).all()
+        lines: Dict[str, list] = {}
+        for menu_item_name, inv_name, quantity in rows:
+            bom = lines.setdefault(menu_item_name, [])
+            if inv_name is not None:
+                bom.append(BomLine(inv_name, quantity))
+        return {n: tuple(lines[n]) if n in lines else None for n in names}
+
+    def _store(self, name: str, bom: Bom):
+        self._drop(name)
+        self._boms[name] = (time.monotonic() + self.ttl, bom)
+        for line in bom or ():
+            self._used_by[line.inventory_item_name].add(name)
+
+    def _drop(self, name: str):
+        _, bom = self._boms.pop(name, (None, None))
+        for line in bom or ():
+            self._used_by[line.inventory_item_name].discard(name)
+
+    def invalidate_menu_item(self, *names: str):
+        with self._lock:
+            self._generation += 1
+            for name in names:
+                self._drop(name)
+
+    def invalidate_inventory_item(self, name: str):
+        with self._lock:
+            self._generation += 1
+            for menu_item_name in list(self._used_by.pop(name, ())):
+                self._drop(menu_item_name)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._boms.clear()
+            self._used_by.clear()
+
+
+bom_cache = BomCache()
@@ -1,12 +1,193 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import logging
 import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from metrics import Histogram, current_request, family, histogram_lines
 
 # load the DATABASE_URL from your .env (you’ll set that up next)
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL, echo=True)
+
+# Pool sizing applies to each engine (sync and async) in each worker process.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = no limit
+
+# SQL logging: every statement (SQL_ECHO), statements slower than
+# SQL_SLOW_MS, plus a random SQL_LOG_SAMPLE fraction of the rest.
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() in ("1", "true", "yes")
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "200"))
+SQL_LOG_SAMPLE = float(os.getenv("SQL_LOG_SAMPLE", "0"))
+
+sql_log = logging.getLogger("coffee.sql")
+if not sql_log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    sql_log.addHandler(_handler)
+    sql_log.setLevel(logging.INFO)
+    sql_log.propagate = False
+
+# "METHOD /path" of the request being served; set by the middleware in main.py.
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="-")
+
+
+class _CheckoutTimer:
+    """Times every checkout, including the wait for a free connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            with self.stats_lock:
+                type(self).timeouts += 1
+            raise
+        finally:
+            self.checkout_wait.observe(time.perf_counter() - started)
+
+
+# Telemetry lives on the classes so it survives Pool.recreate() on dispose().
+class TimedQueuePool(_CheckoutTimer, QueuePool):
+    checkout_wait = Histogram()
+    stats_lock = threading.Lock()
+    timeouts = 0
+
+
+class TimedAsyncQueuePool(_CheckoutTimer, AsyncAdaptedQueuePool):
+    checkout_wait = Histogram()
+    stats_lock = threading.Lock()
+    timeouts = 0
+
+
+def async_url(url: str) -> str:
+    """Same database through an asyncio driver (psycopg 3 for Postgres)."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def engine_options(url: str, poolclass) -> dict:
+    if ":memory:" in url or url in ("sqlite://", "sqlite+aiosqlite://"):
+        return {"echo": SQL_ECHO}  # in-memory SQLite keeps its single-connection pool
+    options = {
+        "echo": SQL_ECHO,
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgres"):
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, TimedQueuePool))
+
+# The order, listing, analytics and auth routes run on the event loop with
+# this engine; the remaining CRUD routes and the CLI scripts use `engine`.
+async_engine = create_async_engine(
+    async_url(DATABASE_URL), **engine_options(async_url(DATABASE_URL), TimedAsyncQueuePool)
+)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+        if stats.shapes is not None:
+            stats.shapes[statement] += 1
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms >= SQL_SLOW_MS:
+        level = logging.WARNING
+    elif SQL_LOG_SAMPLE and random.random() < SQL_LOG_SAMPLE:
+        level = logging.INFO
+    else:
+        return
+    sql_log.log(level, "%.1f ms [%s] %s", elapsed_ms, current_endpoint.get(), " ".join(statement.split()))
+
+
+for _sync_engine in (engine, async_engine.sync_engine):
+    event.listen(_sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(_sync_engine, "after_cursor_execute", _after_execute)
+
+
+def pool_stats() -> dict:
+    """Live pool state per engine, to tell pool starvation apart from slow SQL."""
+    out = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        if not isinstance(pool, _CheckoutTimer):
+            out[name] = {"pool": type(pool).__name__}
+            continue
+        out[name] = {
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "timeouts": type(pool).timeouts,
+            "checkout_wait_seconds": type(pool).checkout_wait.snapshot(),
+        }
+    return out
+
+
+def pool_metric_lines() -> list:
+    """pool_stats() as Prometheus samples."""
+    pools = [(name, s) for name, s in pool_stats().items() if "checked_out" in s]
+    out = []
+    for metric, key, kind, help_text in (
+        ("coffee_db_pool_size", "size", "gauge", "Configured pool size."),
+        ("coffee_db_pool_checked_out", "checked_out", "gauge", "Connections in use."),
+        ("coffee_db_pool_overflow", "overflow", "gauge", "Connections open beyond the pool size."),
+        ("coffee_db_pool_timeouts_total", "timeouts", "counter", "Checkouts that hit DB_POOL_TIMEOUT."),
+    ):
+        out += family(metric, kind, help_text,
+                      (f'{metric}{{engine="{name}"}} {s[key]}' for name, s in pools))
+    out += family(
+        "coffee_db_pool_checkout_wait_seconds", "histogram", "Time to obtain a connection.",
+        (line for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool))
+         if isinstance(pool, _CheckoutTimer)
+         for line in histogram_lines("coffee_db_pool_checkout_wait_seconds",
+                                     type(pool).checkout_wait, engine=name)),
+    )
+    return out
+
+
+def upsert(session, model):
+    """
+    The dialect's INSERT for `model` (SQLite or Postgres), which has
+    on_conflict_do_update; callers add the conflict clause.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    return dialect_insert(model)
+
 
 def init_db():
     """Create all tables in the database."""
@@ -16,3 +197,9 @@ def get_session():
     """Provide a transactional session to path into your path operations."""
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session():
+    """Async counterpart of get_session for `async def` path operations."""
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -0,0 +1,161 @@
+# exports.py
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+
+from database import engine
+from models import AccountingEntry, Order, OrderLineItem
+from timeutil import utc_naive
+
+EXPORT_BATCH = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _in_range(stmt, column, start: Optional[datetime], end: Optional[datetime]):
+    """Half-open [start, end) on a naive-UTC column; aware bounds are converted first."""
+    if start:
+        stmt = stmt.where(column >= utc_naive(start))
+    if end:
+        stmt = stmt.where(column < utc_naive(end))
+    return stmt
+
+
+def _stream_rows(stmt) -> Iterator[List]:
+    """
+    Yield batches of rows from a server-side cursor.
+
+    The session is opened here rather than taken from get_session because
+    the request's dependencies are closed before a streamed body is sent.
+    """
+    with Session(engine) as session:
+        result = session.exec(
+            stmt,
+            execution_options={"stream_results": True, "yield_per": EXPORT_BATCH},
+        )
+        for batch in result.partitions():
+            yield batch
+
+
+def _value(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def _csv(columns: List[str], batches: Iterable[List]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue()
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([[_value(v) for v in row] for row in batch])
+        yield buf.getvalue()
+
+
+def _ndjson(columns: List[str], batches: Iterable[List]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(
+            json.dumps({c: _value(v) for c, v in zip(columns, row)}) + "\n"
+            for row in batch
+        )
+
+
+def _orders_ndjson(batches: Iterable[List]) -> Iterator[str]:
+    """One object per order with its line items; rows arrive grouped by order_id."""
+    current = None
+    for batch in batches:
+        out = []
+        for order_id, ts, payment_method, name, quantity, price in batch:
+            if current is None or current["order_id"] != order_id:
+                if current is not None:
+                    out.append(json.dumps(current) + "\n")
+                current = {
+                    "order_id": order_id,
+                    "timestamp": _value(ts),
+                    "payment_method": payment_method,
+                    "total": 0.0,
+                    "items": [],
+                }
+            if name is not None:
+                current["items"].append(
+                    {"menu_item_name": name, "quantity": quantity, "unit_price": price}
+                )
+                current["total"] += quantity * (price or 0.0)
+        if out:
+            yield "".join(out)
+    if current is not None:
+        yield json.dumps(current) + "\n"
+
+
+def _response(body: Iterator[str], fmt: str, name: str) -> StreamingResponse:
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+def export_orders(fmt: str, start: Optional[datetime], end: Optional[datetime]) -> StreamingResponse:
+    stmt = _in_range(
+        select(
+            Order.order_id,
+            Order.timestamp,
+            Order.payment_method,
+            OrderLineItem.menu_item_name,
+            OrderLineItem.quantity,
+            OrderLineItem.unit_price,
+        )
+        .outerjoin(OrderLineItem, OrderLineItem.order_id == Order.order_id)
+        .order_by(Order.order_id, OrderLineItem.menu_item_name),
+        Order.timestamp, start, end,
+    )
+    columns = ["order_id", "timestamp", "payment_method", "menu_item_name", "quantity", "unit_price"]
+    if fmt == "ndjson":
+        return _response(_orders_ndjson(_stream_rows(stmt)), fmt, "orders")
+    return _response(_csv(columns, _stream_rows(stmt)), fmt, "orders")
+
+
+def export_order_line_items(fmt: str, start: Optional[datetime], end: Optional[datetime]) -> StreamingResponse:
+    stmt = _in_range(
+        select(
+            OrderLineItem.order_id,
+            Order.timestamp,
+            OrderLineItem.menu_item_name,
+            OrderLineItem.quantity,
+            OrderLineItem.unit_price,
+        )
+        .join(Order, Order.order_id == OrderLineItem.order_id)
+        .order_by(OrderLineItem.order_id, OrderLineItem.menu_item_name),
+        Order.timestamp, start, end,
+    )
+    columns = ["order_id", "timestamp", "menu_item_name", "quantity", "unit_price"]
+    writer = _ndjson if fmt == "ndjson" else _csv
+    return _response(writer(columns, _stream_rows(stmt)), fmt, "order_line_items")
+
+
+def export_accounting_entries(fmt: str, start: Optional[datetime], end: Optional[datetime]) -> StreamingResponse:
+    stmt = _in_range(
+        select(
+            AccountingEntry.entry_id,
+            AccountingEntry.timestamp,
+            AccountingEntry.delta,
+            AccountingEntry.balance,
+        ).order_by(AccountingEntry.entry_id),
+        AccountingEntry.timestamp, start, end,
+    )
+    columns = ["entry_id", "timestamp", "delta", "balance"]
+    writer = _ndjson if fmt == "ndjson" else _csv
+    return _response(writer(columns, _stream_rows(stmt)), fmt, "accounting_entries")
@@ -0,0 +1,166 @@
+# forecast.py
+#
+# Stock-out forecast behind GET /inventory_items/forecast. Each ingredient
+# gets an expected use per hour of the week (Monday 00:00 ... Sunday 23:00),
+# fitted from hourly_ingredient_usage over FORECAST_HISTORY_DAYS. Older weeks
+# count less: weights halve every FORECAST_HALF_LIFE_DAYS. So a recent rush
+# shifts the forecast within days, and the weekly shape still comes from the
+# whole year. The decayed sums are taken in SQL, per ingredient and hour of
+# the week, so the fit reads at most 168 rows per ingredient however long
+# the history is.
+#
+# The fit depends only on history, so it is cached for FORECAST_CACHE_TTL
+# seconds. Stock is read fresh on every call. The fitted rates are then run
+# forward hour by hour over FORECAST_HORIZON_DAYS to find when cumulative
+# use passes the amount in stock.
+
+import os
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+from sqlalchemy import Float, Integer, cast, literal
+from sqlmodel import Session, func, select
+
+from cache import MISSING, TTLCache
+from models import HourlyIngredientUsage, InventoryItem, StockForecast
+from rollup import hour_of
+
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "365"))
+FORECAST_HALF_LIFE_DAYS = float(os.getenv("FORECAST_HALF_LIFE_DAYS", "28"))
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "60"))
+# a refill should cover this many days of expected use, plus the safety margin
+FORECAST_COVER_DAYS = int(os.getenv("FORECAST_COVER_DAYS", "7"))
+FORECAST_SAFETY = float(os.getenv("FORECAST_SAFETY", "0.2"))
+FORECAST_CACHE_TTL = float(os.getenv("FORECAST_CACHE_TTL", "300"))
+
+WEEK_HOURS = 7 * 24
+
+fits = TTLCache(1, ttl=FORECAST_CACHE_TTL)
+
+
+def week_slot(hours: np.ndarray) -> np.ndarray:
+    """Hour of the week (0 = Monday 00:00) for datetime64[h] values."""
+    n = hours.astype("datetime64[h]").astype(np.int64)
+    # 1970-01-01 was a Thursday (weekday 3)
+    return ((n // 24 + 3) % 7) * 24 + n % 24
+
+
+def _decayed_terms(session: Session, end: datetime):
+    """(decay weight, hour of the week) of each usage row, computed in SQL."""
+    hour = HourlyIngredientUsage.hour
+    if session.get_bind().dialect.name == "sqlite":
+        age_hours = (func.julianday(end) - func.julianday(hour)) * 24
+        weekday = (cast(func.strftime("%w", hour), Integer) + 6) % 7  # %w: 0 = Sunday
+        hour_of_day = cast(func.strftime("%H", hour), Integer)
+    else:
+        age_hours = func.extract("epoch", literal(end) - hour) / 3600
+        weekday = cast(func.extract("isodow", hour), Integer) - 1
+        hour_of_day = cast(func.extract("hour", hour), Integer)
+    weight = func.power(0.5, cast(age_hours, Float) / (24 * FORECAST_HALF_LIFE_DAYS))
+    return weight, weekday * 24 + hour_of_day
+
+
+def fit_rates(session: Session, now: datetime) -> Tuple[dict, np.ndarray]:
+    """
+    (index by ingredient name, rates) where rates[i, slot] is the decayed
+    average use of ingredient i in that hour of the week. The current,
+    unfinished hour is left out.
+
+    The decayed sums are taken in the database, grouped by ingredient and
+    hour of the week, so a year of hourly rows comes back as at most
+    168 rows per ingredient.
+    """
+    end = hour_of(now)
+    since = end - timedelta(days=FORECAST_HISTORY_DAYS)
+    in_range = (HourlyIngredientUsage.hour >= since, HourlyIngredientUsage.hour < end)
+    weight, slot = _decayed_terms(session, end)
+    first_hour = select(func.min(HourlyIngredientUsage.hour)).where(*in_range).scalar_subquery()
+    rows = session.exec(
+        select(
+            HourlyIngredientUsage.inventory_item_name,
+            slot,
+            func.sum(HourlyIngredientUsage.quantity * weight),
+            first_hour,
+        )
+        .where(*in_range)
+        .group_by(HourlyIngredientUsage.inventory_item_name, slot)
+    ).all()
+    if not rows:
+        return {}, np.zeros((0, WEEK_HOURS))
+
+    index = {name: i for i, name in enumerate(sorted({r[0] for r in rows}))}
+    used = np.zeros((len(index), WEEK_HOURS))
+    used[[index[r[0]] for r in rows], [int(r[1]) for r in rows]] = [float(r[2]) for r in rows]
+    # every hour since the first recorded one counts, including hours with
+    # no orders; before that there is no history, not zero use
+    end_h = np.datetime64(end, "h")
+    calendar = np.arange(np.datetime64(rows[0][3], "h"), end_h, dtype="datetime64[h]")
+    age_days = (end_h - calendar).astype(np.int64) / 24.0
+    exposure = np.bincount(week_slot(calendar), weights=0.5 ** (age_days / FORECAST_HALF_LIFE_DAYS),
+                           minlength=WEEK_HOURS)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(exposure > 0, used / exposure, 0.0)
+    return index, rates
+
+
+def stock_forecast(session: Session, now: datetime = None) -> List[StockForecast]:
+    """Every inventory item, soonest stock-out first."""
+    now = now or datetime.utcnow()
+    fit = fits.get("rates")
+    if fit is MISSING or fit[0] != hour_of(now):
+        fit = (hour_of(now), *fit_rates(session, now))
+        fits.set("rates", fit)
+    _, index, rates = fit
+
+    stock = session.exec(
+        select(InventoryItem.name, InventoryItem.unit, InventoryItem.amount_in_stock)
+        .order_by(InventoryItem.name)
+    ).all()
+    if not stock:
+        return []
+
+    horizon = max(FORECAST_HORIZON_DAYS, FORECAST_COVER_DAYS) * 24
+    # rows for items never used stay zero
+    item_rates = np.zeros((len(stock), WEEK_HOURS))
+    for row, (name, _, _) in enumerate(stock):
+        if name in index:
+            item_rates[row] = rates[index[name]]
+    start = np.datetime64(hour_of(now), "h")
+    slots = week_slot(np.arange(start, start + horizon, dtype="datetime64[h]"))
+    # only the rest of the current hour is still ahead
+    span = np.ones(horizon)
+    span[0] = 1 - (now - hour_of(now)).total_seconds() / 3600
+    offset = np.cumsum(span) - span  # hours from now to the start of each step
+    use = item_rates[:, slots] * span
+    cumulative = np.cumsum(use, axis=1)
+    amounts = np.array([max(s[2], 0.0) for s in stock])
+
+    runs_out = cumulative >= amounts[:, None]
+    first = runs_out.argmax(axis=1)
+    hit = runs_out[np.arange(len(stock)), first] & (cumulative[:, -1] > 0)
+    before = np.where(first > 0, cumulative[np.arange(len(stock)), first - 1], 0.0)
+    in_hour = use[np.arange(len(stock)), first]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # linear within the hour it runs out
+        hours_left = offset[first] + span[first] * np.where(in_hour > 0, (amounts - before) / in_hour, 0.0)
+    hours_left[amounts <= 0] = 0.0
+    needed = cumulative[:, FORECAST_COVER_DAYS * 24 - 1] * (1 + FORECAST_SAFETY)
+    refill = np.maximum(needed - amounts, 0.0)
+    daily = item_rates.sum(axis=1) / 7
+
+    out = []
+    for row, (name, unit, amount) in enumerate(stock):
+        out_now = amounts[row] <= 0
+        days = float(hours_left[row]) / 24 if hit[row] or out_now else None
+        out.append(StockForecast(
+            name=name,
+            unit=unit,
+            amount_in_stock=amount,
+            daily_rate=round(float(daily[row]), 4),
+            days_until_stockout=None if days is None else round(days, 2),
+            stockout_at=None if days is None else now + timedelta(days=days),
+            suggested_refill=round(float(refill[row]), 4),
+        ))
+    out.sort(key=lambda f: (f.days_until_stockout is None, f.days_until_stockout or 0.0, f.name))
+    return out
@@ -0,0 +1,107 @@
+# hashing.py
+#
+# bcrypt is deliberately slow. Running it on the request threads lets a
+# burst of logins starve everything else (including the POS order path), so
+# all hashing goes through one small pool with admission control: at most
+# HASH_WORKERS hashes run at once, at most HASH_QUEUE_SIZE more wait, and
+# anything beyond that is turned away at once with 503 + Retry-After.
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from metrics import Histogram, family, histogram_lines
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "2"))
+
+
+class HashPool:
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        # bcrypt releases the GIL, so threads hash in parallel
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.admitted = 0   # accepted and not finished
+        self.running = 0
+        self.rejected = 0
+        self.wait_seconds = Histogram()
+        self.hash_seconds = Histogram()
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password operations in progress, retry shortly",
+                headers={"Retry-After": str(HASH_RETRY_AFTER)},
+            )
+        with self._lock:
+            self.admitted += 1
+        try:
+            future = self._executor.submit(self._timed, time.perf_counter(), fn, args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def run(self, fn, *args):
+        """Submit and wait; for callers already running on a worker thread."""
+        return self.submit(fn, *args).result()
+
+    def _timed(self, queued_at: float, fn, args):
+        started = time.perf_counter()
+        self.wait_seconds.observe(started - queued_at)
+        with self._lock:
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+            self.hash_seconds.observe(time.perf_counter() - started)
+
+    def _release(self):
+        with self._lock:
+            self.admitted -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            admitted, running, rejected = self.admitted, self.running, self.rejected
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "running": running,
+            "queue_depth": admitted - running,
+            "rejected": rejected,
+            "wait_seconds": self.wait_seconds.snapshot(),
+            "hash_seconds": self.hash_seconds.snapshot(),
+        }
+
+    def metric_lines(self) -> list:
+        """stats() as Prometheus samples."""
+        s = self.stats()
+        return [
+            *family("coffee_hash_pool_running", "gauge", "Password hashes in progress.",
+                    [f"coffee_hash_pool_running {s['running']}"]),
+            *family("coffee_hash_pool_queue_depth", "gauge", "Password hashes waiting for a worker.",
+                    [f"coffee_hash_pool_queue_depth {s['queue_depth']}"]),
+            *family("coffee_hash_pool_rejected_total", "counter", "Password operations turned away with 503.",
+                    [f"coffee_hash_pool_rejected_total {s['rejected']}"]),
+            *family("coffee_hash_pool_wait_seconds", "histogram", "Queueing time before hashing.",
+                    histogram_lines("coffee_hash_pool_wait_seconds", self.wait_seconds)),
+            *family("coffee_hash_pool_hash_seconds", "histogram", "Time spent hashing.",
+                    histogram_lines("coffee_hash_pool_hash_seconds", self.hash_seconds)),
+        ]
+
+
+hash_pool = HashPool(HASH_WORKERS, HASH_QUEUE_SIZE)
@@ -0,0 +1,76 @@
+# inventory.py
+
+import os
+from typing import Dict, List, NamedTuple, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import case, update
+from sqlmodel import Session
+
+from models import InventoryItem, LowStockItem
+
+# "allow" lets stock go negative (the historical behaviour), "reject" fails the order
+STOCK_POLICY = os.getenv("STOCK_POLICY", "allow")
+LOW_STOCK_THRESHOLD = float(os.getenv("LOW_STOCK_THRESHOLD", "10"))
+
+
+class StockLevel(NamedTuple):
+    amount_in_stock: float
+    price_per_unit: float
+
+
+def adjust_stock(session: Session, deltas: Dict[str, float]) -> Dict[str, StockLevel]:
+    """
+    Add each delta to amount_in_stock with one set-based UPDATE and return
+    the new amounts, with each row's price. The arithmetic happens in the
+    database, so concurrent writers serialize on the row locks instead of
+    overwriting each other, and the prices are the ones in effect under
+    those locks. Nothing is committed here.
+    """
+    if not deltas:
+        return {}
+    stmt = (
+        update(InventoryItem)
+        .where(InventoryItem.name.in_(list(deltas)))
+        .values(
+            amount_in_stock=InventoryItem.amount_in_stock
+            + case(deltas, value=InventoryItem.name)
+        )
+        .returning(InventoryItem.name, InventoryItem.amount_in_stock, InventoryItem.price_per_unit)
+        .execution_options(synchronize_session=False)
+    )
+    return {name: StockLevel(amount, price) for name, amount, price in session.exec(stmt).all()}
+
+
+def deduct_stock(
+    session: Session,
+    usage: Dict[str, float],
+    policy: str = None,
+    threshold: float = None,
+) -> Tuple[List[LowStockItem], Dict[str, float]]:
+    """
+    Subtract a ticket's net ingredient usage. Returns the items now below
+    the low-stock threshold, and the price_per_unit of every item used, to
+    cost the ticket with. With the "reject" policy an item going negative
+    raises, and the caller's transaction must be rolled back.
+    """
+    policy = policy or STOCK_POLICY
+    threshold = LOW_STOCK_THRESHOLD if threshold is None else threshold
+
+    remaining = adjust_stock(session, {name: -qty for name, qty in usage.items()})
+    missing = set(usage) - set(remaining)
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Inventory item {sorted(missing)[0]} not found",
+        )
+    if policy == "reject":
+        for name, level in sorted(remaining.items()):
+            if level.amount_in_stock < 0:
+                raise HTTPException(status_code=409, detail=f"Not enough {name} in stock")
+    low_stock = [
+        LowStockItem(name=name, amount_in_stock=level.amount_in_stock)
+        for name, level in sorted(remaining.items())
+        if level.amount_in_stock < threshold
+    ]
+    return low_stock, {name: level.price_per_unit for name, level in remaining.items()}
@@ -0,0 +1,138 @@
+# ledger.py
+
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import case, update
+from sqlmodel import Session, select
+
+from database import upsert
+from models import AccountingEntry, BalanceHistory, BalancePoint, LedgerCheckpoint, LedgerHead
+
+HEAD_ID = 1
+MAX_HISTORY_POINTS = 2000
+
+
+def ensure_ledger_head(session: Session) -> LedgerHead:
+    """Create the head row on first start, seeded from the latest entry."""
+    head = session.get(LedgerHead, HEAD_ID)
+    if head:
+        return head
+    last = session.exec(
+        select(AccountingEntry).order_by(
+            AccountingEntry.timestamp.desc(), AccountingEntry.entry_id.desc()
+        )
+    ).first()
+    head = LedgerHead(id=HEAD_ID, balance=last.balance if last else 0.0)
+    session.add(head)
+    session.commit()
+    return head
+
+
+def post_entry(
+    session: Session, delta: float, timestamp: Optional[datetime] = None
+) -> AccountingEntry:
+    """
+    Move the running balance by delta and record the entry.
+
+    The new balance comes from an in-place increment of the head row, so no
+    "latest entry" read is needed and concurrent writers queue on that one
+    row lock instead of racing on a stale balance. Call this as the last
+    write before commit to keep the lock short. Nothing is committed here.
+    """
+    balance = session.exec(
+        update(LedgerHead)
+        .where(LedgerHead.id == HEAD_ID)
+        .values(balance=LedgerHead.balance + delta)
+        .returning(LedgerHead.balance)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    entry = AccountingEntry(
+        timestamp=timestamp or datetime.utcnow(), delta=delta, balance=balance
+    )
+    session.add(entry)
+    record_checkpoints(session, entry.timestamp, balance - delta, balance)
+    return entry
+
+
+def record_checkpoints(session: Session, at: datetime, before: float, after: float):
+    """Fold one entry into its hour and day checkpoints (one statement)."""
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    stmt = upsert(session, LedgerCheckpoint).values([
+        {
+            "resolution": resolution, "bucket": bucket, "open": before,
+            "low": min(before, after), "high": max(before, after), "close": after, "entries": 1,
+        }
+        for resolution, bucket in (("hour", hour), ("day", hour.replace(hour=0)))
+    ])
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LedgerCheckpoint.resolution, LedgerCheckpoint.bucket],
+        set_={
+            "low": case((new.low < LedgerCheckpoint.low, new.low), else_=LedgerCheckpoint.low),
+            "high": case((new.high > LedgerCheckpoint.high, new.high), else_=LedgerCheckpoint.high),
+            # entries are posted under the head row lock, so the latest write closes the bucket
+            "close": new.close,
+            "entries": LedgerCheckpoint.entries + 1,
+        },
+    )
+    session.exec(stmt)
+
+
+def current_balance(session: Session) -> float:
+    return session.exec(
+        select(LedgerHead.balance).where(LedgerHead.id == HEAD_ID)
+    ).one()
+
+
+def balance_at(session: Session, at: datetime) -> float:
+    """Balance as of `at`, from the last entry at or before it."""
+    balance = session.exec(
+        select(AccountingEntry.balance)
+        .where(AccountingEntry.timestamp <= at)
+        .order_by(AccountingEntry.timestamp.desc(), AccountingEntry.entry_id.desc())
+        .limit(1)
+    ).first()
+    return balance if balance is not None else 0.0
+
+
+def balance_history(session: Session, start: datetime, end: datetime, points: int) -> BalanceHistory:
+    """
+    The balance over [start, end) in at most `points` buckets, merged from
+    hourly checkpoints when a bucket is under a day wide, daily ones otherwise.
+    Buckets are whole hours or days, so each point is exact; the first one
+    starts at the hour or day containing `start`, and the last one runs to
+    the end of the hour or day containing the last instant before `end`.
+    """
+    resolution = "hour" if (end - start) / points < timedelta(days=1) else "day"
+    unit = timedelta(hours=1) if resolution == "hour" else timedelta(days=1)
+    first = start.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        first = first.replace(hour=0)
+    width = unit * math.ceil((end - first) / unit / points)
+    rows = session.exec(
+        select(LedgerCheckpoint)
+        .where(
+            LedgerCheckpoint.resolution == resolution,
+            LedgerCheckpoint.bucket >= first,
+            LedgerCheckpoint.bucket < end,
+        )
+        .order_by(LedgerCheckpoint.bucket)
+    ).all()
+
+    merged: Dict[int, BalancePoint] = {}
+    for row in rows:
+        i = (row.bucket - first) // width
+        point = merged.get(i)
+        if point is None:
+            merged[i] = BalancePoint(
+                start=first + i * width, open=row.open, low=row.low,
+                high=row.high, close=row.close, entries=row.entries,
+            )
+        else:
+            point.low = min(point.low, row.low)
+            point.high = max(point.high, row.high)
+            point.close = row.close
+            point.entries += row.entries
+    return BalanceHistory(resolution=resolution, points=[merged[i] for i in sorted(merged)])
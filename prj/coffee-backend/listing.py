@@ -0,0 +1,150 @@
+# listing.py
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import List, Literal, Optional
+
+from fastapi import HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import String, tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from timeutil import utc_naive
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class ListParams:
+    cursor: Optional[str]
+    limit: int
+    order: str
+    fields: Optional[List[str]]
+    start: Optional[datetime]
+    end: Optional[datetime]
+
+
+def list_params(
+    cursor: Optional[str] = Query(None, description=f"value of the {NEXT_CURSOR_HEADER} header of the previous page"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    order: Literal["asc", "desc"] = Query("asc", description="primary key order; desc pages from the newest row"),
+    fields: Optional[str] = Query(None, description="comma-separated columns to return"),
+    start: Optional[datetime] = Query(None, description="inclusive lower bound on the model's time column"),
+    end: Optional[datetime] = Query(None, description="exclusive upper bound on the model's time column"),
+) -> ListParams:
+    return ListParams(
+        cursor=cursor,
+        limit=limit,
+        order=order,
+        fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+        start=utc_naive(start) if start else None,
+        end=utc_naive(end) if end else None,
+    )
+
+
+# JSON types a cursor value may have, per column python type
+_JSON_TYPES = {int: (int,), float: (int, float), Decimal: (int, float, str), str: (str,), bool: (bool,)}
+
+
+def _parse(column, value):
+    """
+    Turn a JSON cursor value back into the column's python type; ValueError
+    if it cannot be one (so a forged cursor is a 400, not a database error).
+    """
+    if value is None:
+        return None
+    try:
+        py_type = column.type.python_type
+    except NotImplementedError:  # e.g. sqlmodel's AutoString, a decorated String
+        py_type = str if isinstance(getattr(column.type, "impl", column.type), String) else None
+    if py_type in (datetime, date, time):
+        if not isinstance(value, str):
+            raise ValueError(f"{column.name}: expected an ISO timestamp")
+        return py_type.fromisoformat(value)
+    if isinstance(py_type, type) and issubclass(py_type, Enum):
+        return py_type(value)
+    accepted = _JSON_TYPES.get(py_type)
+    if accepted is None:
+        return value
+    if not isinstance(value, accepted) or (isinstance(value, bool) and py_type is not bool):
+        raise ValueError(f"{column.name}: expected {py_type.__name__}")
+    return py_type(value)
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(jsonable_encoder(list(values))).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_parse(c, v) for c, v in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def list_page(
+    session: AsyncSession,
+    model,
+    params: ListParams,
+    time_column=None,
+    exclude=(),
+) -> JSONResponse:
+    """
+    One page of `model`, ordered by primary key (ascending, or descending
+    with order=desc) and continued by keyset.
+
+    Only the requested columns are selected and rows go straight to JSON
+    without building ORM objects. When the page is full, the cursor for the
+    next one is returned in the X-Next-Cursor header.
+    """
+    table = model.__table__
+    available = [c for c in table.columns if c.name not in exclude]
+    if params.fields:
+        unknown = [f for f in params.fields if f not in {c.name for c in available}]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown field {unknown[0]}")
+        wanted = [table.columns[f] for f in params.fields]
+    else:
+        wanted = available
+
+    keys = list(table.primary_key.columns)
+    extra = [k for k in keys if k.name not in {c.name for c in wanted}]
+    descending = params.order == "desc"
+    stmt = select(*wanted, *extra).order_by(
+        *(k.desc() if descending else k for k in keys)
+    ).limit(params.limit)
+
+    if params.cursor:
+        after = decode_cursor(params.cursor, keys)
+        position = tuple_(*keys) if len(keys) > 1 else keys[0]
+        boundary = tuple_(*after) if len(keys) > 1 else after[0]
+        stmt = stmt.where(position < boundary if descending else position > boundary)
+    if params.start or params.end:
+        if time_column is None:
+            raise HTTPException(status_code=400, detail="This list has no time range filter")
+        if params.start:
+            stmt = stmt.where(time_column >= params.start)
+        if params.end:
+            stmt = stmt.where(time_column < params.end)
+
+    rows = (await session.exec(stmt)).all()
+    names = [c.name for c in wanted]
+    body = [{n: row._mapping[n] for n in names} for row in rows]
+
+    headers = {}
+    if len(rows) == params.limit:
+        last = rows[-1]._mapping
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(last[k.name] for k in keys)
+    return JSONResponse(content=jsonable_encoder(body), headers=headers)
@@ -0,0 +1,144 @@
+# llm.py
+#
+# Drink descriptions from the local LLM (Ollama chat API). A generation
+# takes seconds, so:
+#   - calls go through one pooled AsyncClient with timeouts, at most
+#     LLM_MAX_CONCURRENCY at a time;
+#   - concurrent requests for the same drink share one in-flight generation;
+#   - results are stored in drink_description keyed by (drink, model); rows
+#     beyond LLM_CACHE_MAX_ROWS are evicted least recently used first, and
+#     ?refresh=true regenerates a description.
+#
+# Without a model at hand, run the stub instead:
+#     uvicorn llm_stub:app --port 11434
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+from sqlalchemy import delete
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_engine
+from models import DrinkDescription
+
+LLM_URL = os.getenv("LLM_URL", "http://localhost:11434/api/chat")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama2")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "2"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "1000"))
+
+# last_used_at is only rewritten when older than this, so hits stay read-only
+TOUCH_AFTER = timedelta(hours=1)
+
+Key = Tuple[str, str]  # (drink, model)
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None
+_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+_inflight: Dict[Key, asyncio.Task] = {}
+
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]):
+    """Route LLM calls through `transport` (e.g. ASGITransport(llm_stub.app))."""
+    global _transport
+    _transport = transport
+
+
+def client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONCURRENCY,
+                max_keepalive_connections=LLM_MAX_CONCURRENCY,
+            ),
+            transport=_transport,
+        )
+    return _client
+
+
+async def close():
+    """Called on shutdown; the next call opens a fresh client."""
+    global _client, _slots
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    _inflight.clear()
+
+
+async def generate(drink: str) -> str:
+    prompt = f"Give me a brief history and serving suggestions for the drink called '{drink}'."
+    async with _slots:
+        try:
+            resp = await client().post(LLM_URL, json={
+                "model": LLM_MODEL,
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": False,
+            })
+            resp.raise_for_status()
+        except httpx.TimeoutException:
+            raise HTTPException(status.HTTP_504_GATEWAY_TIMEOUT, "The description service timed out")
+        except httpx.HTTPError:
+            raise HTTPException(status.HTTP_502_BAD_GATEWAY, "The description service is unavailable")
+    body = resp.json()
+    if "message" in body:  # Ollama
+        return body["message"]["content"]
+    return body["choices"][0]["message"]["content"]  # OpenAI-compatible servers
+
+
+async def _generate_and_store(key: Key) -> str:
+    description = await generate(key[0])
+    now = datetime.utcnow()
+    # own session: the generation outlives whichever request started it
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        await session.merge(DrinkDescription(
+            drink=key[0], model=key[1], description=description,
+            created_at=now, last_used_at=now,
+        ))
+        await session.flush()
+        cutoff = (await session.exec(
+            select(DrinkDescription.last_used_at)
+            .order_by(DrinkDescription.last_used_at.desc())
+            .offset(LLM_CACHE_MAX_ROWS)
+            .limit(1)
+        )).first()
+        if cutoff is not None:
+            await session.exec(delete(DrinkDescription).where(DrinkDescription.last_used_at <= cutoff))
+        await session.commit()
+    return description
+
+
+def _finished(key: Key, task: asyncio.Task):
+    _inflight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # retrieved even if every waiter went away
+
+
+async def describe(session: AsyncSession, drink: str, refresh: bool = False) -> str:
+    key = (drink, LLM_MODEL)
+    if not refresh:
+        row = await session.get(DrinkDescription, key)
+        if row is not None:
+            now = datetime.utcnow()
+            if now - row.last_used_at > TOUCH_AFTER:
+                row.last_used_at = now
+                await session.commit()
+            return row.description
+
+    # don't hold a pooled connection for the seconds a generation takes
+    await session.close()
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_generate_and_store(key))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _finished(key, t))
+    # a client disconnecting must not cancel a generation others are waiting on
+    return await asyncio.shield(task)
@@ -0,0 +1,42 @@
+# llm_stub.py
+#
+# Minimal stand-in for the Ollama chat API, for local development and the
+# query-budget harness:
+#     uvicorn llm_stub:app --port 11434
+#
+# LLM_STUB_DELAY (seconds) simulates generation time.
+
+import asyncio
+import os
+from typing import List
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+LLM_STUB_DELAY = float(os.getenv("LLM_STUB_DELAY", "0"))
+
+app = FastAPI()
+app.state.calls = 0
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatRequest(BaseModel):
+    model: str
+    messages: List[ChatMessage]
+    stream: bool = True
+
+
+@app.post("/api/chat")
+async def chat(req: ChatRequest):
+    app.state.calls += 1
+    await asyncio.sleep(LLM_STUB_DELAY)
+    prompt = req.messages[-1].content if req.messages else ""
+    return {
+        "model": req.model,
+        "message": {"role": "assistant", "content": f"[stub:{req.model}] {prompt}"},
+        "done": True,
+    }
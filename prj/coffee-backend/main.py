@@ -1,20 +1,33 @@
+from time import perf_counter
 from typing import List, Literal, Optional
-from datetime import datetime, time, date
+from datetime import datetime, date
 
-import httpx
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, HTTPException, Request, status, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from sqlmodel import select, Session, delete, func
-from sqlalchemy import update, and_
-
-from database import init_db, get_session
+from sqlalchemy import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import (
+    async_engine,
+    current_endpoint,
+    engine,
+    get_async_session,
+    get_session,
+    init_db,
+    pool_metric_lines,
+    pool_stats,
+)
 from auth import (
     authenticate_user,
-    create_access_token,
     get_current_user,
     get_password_hash,
+    get_password_hash_async,
+    invalidate_principal,
+    principal_token,
     require_manager_role,
 )
 from models import (
@@ -32,11 +45,48 @@ from models import (
     OrderLineItem,
     Promotion,
     PromotionItem,
-    ShiftLog,
     EmployeeCreate,
     EmployeeRead,
     EmployeeUpdate,
+    OrderCreate,
+    OrderRead,
+    Principal,
+    BatchOrder,
+    BatchOrderResp,
+    StockForecast,
+    EventType,
+    ShiftEvent,
+    PayrollLine,
+    ShiftDraft,
+    StaffingReport,
+    BalanceHistory,
+)
+from orders import place_order, place_order_batch
+from order_writer import ORDER_WRITE_MODE, order_writer
+from pricing import promotion_index
+from shiftlog import payroll, shift_log
+from staffing import coverage
+from bom_cache import bom_cache
+from inventory import adjust_stock
+from ledger import (
+    MAX_HISTORY_POINTS,
+    balance_at,
+    balance_history,
+    current_balance,
+    ensure_ledger_head,
+    post_entry,
 )
+from hashing import hash_pool
+from metrics import RequestStats, current_request, route_metrics
+from query_budget import QUERY_BUDGET_CHECK, QueryBudgetMiddleware
+from listing import NEXT_CURSOR_HEADER, ListParams, list_page, list_params
+import analytics
+import llm
+import recommender
+from rollup import rebuild_daily_item_sales, rebuild_hourly_usage
+from forecast import fits as forecast_fits, stock_forecast
+from exports import export_accounting_entries, export_order_line_items, export_orders
+from timeutil import utc_naive
 
 app = FastAPI()
 
@@ -46,11 +96,57 @@ def protected():
     return Depends(get_current_user)
 
 
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    """
+    Label SQL logged while serving this request (see database.py) and record
+    its latency, status and SQL usage for /metrics. Streamed bodies are
+    timed to the first byte.
+    """
+    stats = current_request.get() or RequestStats()  # QueryBudgetMiddleware may have started it
+    endpoint_token = current_endpoint.set(f"{request.method} {request.url.path}")
+    stats_token = current_request.set(stats)
+    started = perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_metrics.record(
+            request.method,
+            route.path if route is not None else "unmatched",
+            status_code,
+            perf_counter() - started,
+            stats,
+        )
+        current_request.reset(stats_token)
+        current_endpoint.reset(endpoint_token)
+
+
 # ── STARTUP ──
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+    with Session(engine) as session:
+        ensure_ledger_head(session)
+    shift_log.start()
+    recommender.start()
+    promotion_index.start()
+    if ORDER_WRITE_MODE == "group":
+        order_writer.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await llm.close()
+    await order_writer.close()
+    await recommender.close()
+    await promotion_index.close()
+    await shift_log.close()
+    await async_engine.dispose()
 
 
 # ── “ME” ENDPOINT ──
@@ -66,18 +162,13 @@ class MeResp(BaseModel):
 
 
 @app.get("/me", response_model=MeResp, dependencies=[protected()])
-def read_current_user(
-    current: Employee = Depends(get_current_user),
-    session: Session = Depends(get_session),
-):
-    is_mgr = session.exec(select(Manager).where(Manager.ssn == current.ssn)).first()
-    role = "manager" if is_mgr else "barista"
+async def read_current_user(current: Principal = Depends(get_current_user)):
     return MeResp(
         ssn=current.ssn,
         name=current.name,
         email=current.email,
         salary=current.salary,
-        role=role,
+        role=current.role,
     )
 
 
@@ -92,127 +183,251 @@ class SignupPayload(BaseModel):
 
 
 @app.post("/signup", status_code=status.HTTP_201_CREATED)
-def signup(user_in: SignupPayload, session: Session = Depends(get_session)):
-    if session.exec(select(Employee).where(Employee.email == user_in.email)).first():
+async def signup(user_in: SignupPayload, session: AsyncSession = Depends(get_async_session)):
+    if (await session.exec(select(Employee).where(Employee.email == user_in.email))).first():
         raise HTTPException(400, "Email already registered")
-    if session.get(Employee, user_in.ssn):
+    if await session.get(Employee, user_in.ssn):
         raise HTTPException(400, "SSN already registered")
 
-    hashed = get_password_hash(user_in.password)
+    hashed = await get_password_hash_async(user_in.password)
     new_emp = Employee(**user_in.dict(exclude={"password"}), password_hash=hashed)
     session.add(new_emp)
-    session.commit()
-    session.refresh(new_emp)
-
+    await session.flush()
     session.add(Manager(ssn=new_emp.ssn, ownership_percentage=0.0))
-    session.commit()
-    mgrs = session.exec(select(Manager)).all()
-    share = 100.0 / len(mgrs)
-    for m in mgrs:
-        m.ownership_percentage = share
-        session.add(m)
-    session.commit()
+    await session.flush()
 
-    token = create_access_token({"sub": new_emp.email})
+    # every manager gets an equal share, in one statement
+    manager_count = select(func.count()).select_from(Manager).scalar_subquery()
+    await session.exec(update(Manager).values(ownership_percentage=100.0 / manager_count))
+    await session.commit()
+
+    token = principal_token(
+        Principal(**user_in.dict(exclude={"password"}), role="manager")
+    )
     return {"access_token": token, "token_type": "bearer"}
 
 
 @app.post("/token")
-def login(
+async def login(
     form: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    user = authenticate_user(form.username, form.password, session)
+    user = await authenticate_user(form.username, form.password, session)
     if not user:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid credentials")
-    token = create_access_token({"sub": user.email})
+    token = principal_token(user)
     return {"access_token": token, "token_type": "bearer"}
 
 
+@app.get("/auth/hash_stats", dependencies=[Depends(require_manager_role)])
+def password_hash_stats():
+    """Hash pool latency and queue depth, for sizing HASH_WORKERS/HASH_QUEUE_SIZE."""
+    return hash_pool.stats()
+
+
+@app.get("/db/pool_stats", dependencies=[Depends(require_manager_role)])
+def database_pool_stats():
+    """Connections in use, overflow and checkout waits per engine."""
+    return pool_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus text exposition (version 0.0.4) of this worker's metrics."""
+    lines = route_metrics.render() + pool_metric_lines() + hash_pool.metric_lines()
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
 # ── LISTING ENDPOINTS ──
+# Paged by primary key (?limit=&cursor=), projected with ?fields=a,b and,
+# where the model has a time column, filtered with ?start=&end=.
 
 @app.get("/employees", response_model=List[Employee], dependencies=[protected()])
 @app.get("/employees/", response_model=List[Employee], dependencies=[protected()])
-def list_employees(session: Session = Depends(get_session)):
-    return session.exec(select(Employee)).all()
+async def list_employees(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, Employee, params, exclude=("password_hash",))
 
 
 @app.get("/managers", response_model=List[Manager], dependencies=[protected()])
 @app.get("/managers/", response_model=List[Manager], dependencies=[protected()])
-def list_managers(session: Session = Depends(get_session)):
-    return session.exec(select(Manager)).all()
+async def list_managers(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, Manager, params)
 
 
 @app.get("/baristas", response_model=List[Barista], dependencies=[protected()])
 @app.get("/baristas/", response_model=List[Barista], dependencies=[protected()])
-def list_baristas(session: Session = Depends(get_session)):
-    return session.exec(select(Barista)).all()
+async def list_baristas(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, Barista, params)
 
 
 @app.get("/work_schedules", response_model=List[WorkSchedule], dependencies=[protected()])
 @app.get("/work_schedules/", response_model=List[WorkSchedule], dependencies=[protected()])
-def list_work_schedules(session: Session = Depends(get_session)):
-    return session.exec(select(WorkSchedule)).all()
+async def list_work_schedules(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, WorkSchedule, params)
 
 
 @app.get("/accounting_entries", response_model=List[AccountingEntry], dependencies=[protected()])
 @app.get("/accounting_entries/", response_model=List[AccountingEntry], dependencies=[protected()])
-def list_accounting_entries(session: Session = Depends(get_session)):
-    return session.exec(select(AccountingEntry)).all()
+async def list_accounting_entries(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, AccountingEntry, params, time_column=AccountingEntry.timestamp)
+
+
+class BalanceResp(BaseModel):
+    at: Optional[datetime]
+    balance: float
+
+
+@app.get("/accounting_entries/balance", response_model=BalanceResp, dependencies=[protected()])
+async def read_balance(
+    at: Optional[datetime] = Query(None, description="defaults to the current balance"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    if at is None:
+        return BalanceResp(at=None, balance=await session.run_sync(current_balance))
+    return BalanceResp(at=at, balance=await session.run_sync(balance_at, at))
+
+
+@app.get("/accounting_entries/history", response_model=BalanceHistory, dependencies=[protected()])
+async def read_balance_history(
+    start: datetime = Query(..., description="UTC"),
+    end: Optional[datetime] = Query(None, description="UTC; defaults to now"),
+    points: int = Query(300, ge=1, le=MAX_HISTORY_POINTS),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Downsampled balance for charts, read from the hourly/daily ledger checkpoints."""
+    start, end = utc_naive(start), utc_naive(end) if end else datetime.utcnow()
+    if end <= start:
+        raise HTTPException(400, "end must be after start")
+    return await session.run_sync(balance_history, start, end, points)
 
 
 @app.get("/inventory_items", response_model=List[InventoryItem], dependencies=[protected()])
 @app.get("/inventory_items/", response_model=List[InventoryItem], dependencies=[protected()])
-def list_inventory_items(session: Session = Depends(get_session)):
-    return session.exec(select(InventoryItem)).all()
+async def list_inventory_items(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, InventoryItem, params)
 
 
 @app.get("/menu_items", response_model=List[MenuItem], dependencies=[protected()])
 @app.get("/menu_items/", response_model=List[MenuItem], dependencies=[protected()])
-def list_menu_items(session: Session = Depends(get_session)):
-    return session.exec(select(MenuItem)).all()
+async def list_menu_items(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, MenuItem, params)
 
 
 @app.get("/recipes", response_model=List[Recipe], dependencies=[protected()])
 @app.get("/recipes/", response_model=List[Recipe], dependencies=[protected()])
-def list_recipes(session: Session = Depends(get_session)):
-    return session.exec(select(Recipe)).all()
+async def list_recipes(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, Recipe, params)
 
 
 @app.get("/preparation_steps", response_model=List[PreparationStep], dependencies=[protected()])
 @app.get("/preparation_steps/", response_model=List[PreparationStep], dependencies=[protected()])
-def list_preparation_steps(session: Session = Depends(get_session)):
-    return session.exec(select(PreparationStep)).all()
+async def list_preparation_steps(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, PreparationStep, params)
 
 
 @app.get("/recipe_ingredients", response_model=List[RecipeIngredient], dependencies=[protected()])
 @app.get("/recipe_ingredients/", response_model=List[RecipeIngredient], dependencies=[protected()])
-def list_recipe_ingredients(session: Session = Depends(get_session)):
-    return session.exec(select(RecipeIngredient)).all()
+async def list_recipe_ingredients(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, RecipeIngredient, params)
 
 
 @app.get("/orders", response_model=List[Order], dependencies=[protected()])
 @app.get("/orders/", response_model=List[Order], dependencies=[protected()])
-def list_orders(session: Session = Depends(get_session)):
-    return session.exec(select(Order)).all()
+async def list_orders(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, Order, params, time_column=Order.timestamp)
 
 
 @app.get("/order_line_items", response_model=List[OrderLineItem], dependencies=[protected()])
 @app.get("/order_line_items/", response_model=List[OrderLineItem], dependencies=[protected()])
-def list_order_line_items(session: Session = Depends(get_session)):
-    return session.exec(select(OrderLineItem)).all()
+async def list_order_line_items(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, OrderLineItem, params)
 
 
 @app.get("/promotions", response_model=List[Promotion], dependencies=[protected()])
 @app.get("/promotions/", response_model=List[Promotion], dependencies=[protected()])
-def list_promotions(session: Session = Depends(get_session)):
-    return session.exec(select(Promotion)).all()
+async def list_promotions(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, Promotion, params, time_column=Promotion.start_time)
 
 
 @app.get("/promotion_items", response_model=List[PromotionItem], dependencies=[protected()])
 @app.get("/promotion_items/", response_model=List[PromotionItem], dependencies=[protected()])
-def list_promotion_items(session: Session = Depends(get_session)):
-    return session.exec(select(PromotionItem)).all()
+async def list_promotion_items(
+    params: ListParams = Depends(list_params),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await list_page(session, PromotionItem, params)
+
+
+# ── STREAMING EXPORTS ──
+# Rows are streamed from a server-side cursor, so memory stays flat for any range.
+
+ExportFormat = Literal["ndjson", "csv"]
+
+
+@app.get("/exports/orders", dependencies=[protected()])
+def export_orders_route(
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+):
+    return export_orders(fmt, start, end)
+
+
+@app.get("/exports/order_line_items", dependencies=[protected()])
+def export_order_line_items_route(
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+):
+    return export_order_line_items(fmt, start, end)
+
+
+@app.get("/exports/accounting_entries", dependencies=[protected()])
+def export_accounting_entries_route(
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+):
+    return export_accounting_entries(fmt, start, end)
 
 
 # ---- 3) INVENTORY REFILL ----
@@ -233,92 +448,54 @@ def refill_inventory(
     item = session.get(InventoryItem, name)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    item.amount_in_stock += payload.quantity
-    cost = item.price_per_unit * payload.quantity
-
-    last = session.exec(
-        select(AccountingEntry).order_by(AccountingEntry.timestamp.desc())
-    ).first()
-    prev_bal = last.balance if last else 0.0
-
-    entry = AccountingEntry(timestamp=datetime.utcnow(), balance=prev_bal - cost)
-    session.add(item)
-    session.add(entry)
+    adjust_stock(session, {name: payload.quantity})
+    post_entry(session, -item.price_per_unit * payload.quantity)
     session.commit()
+    bom_cache.invalidate_inventory_item(name)
     session.refresh(item)
     return item
 
 
-# ---- 4) CREATE ORDER (barista) ----
-class OrderItem(BaseModel):
-    menu_item_name: str
-    quantity: int
+@app.get(
+    "/inventory_items/forecast",
+    response_model=List[StockForecast],
+    dependencies=[protected()],
+)
+async def inventory_forecast(session: AsyncSession = Depends(get_async_session)):
+    """When each ingredient runs out at the expected pace, and how much to reorder."""
+    return await session.run_sync(stock_forecast)
 
-class OrderCreate(BaseModel):
-    items: List[OrderItem]
-    payment_method: str
 
+# ---- 4) CREATE ORDER (barista) ----
 @app.post("/orders", include_in_schema=False)
-@app.post("/orders/", response_model=Order, dependencies=[protected()])
-def create_order(
+@app.post("/orders/", response_model=OrderRead, dependencies=[protected()])
+async def create_order(
     order_in: OrderCreate,
-    session=Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current=Depends(get_current_user),
 ):
-    # 1) create the order header
-    order = Order(timestamp=datetime.utcnow(), payment_method=order_in.payment_method)
-    session.add(order)
-    session.commit()
-    session.refresh(order)
-
-    total_income = 0.0
-    total_cost = 0.0
-
-    # 2) for each requested item
-    for it in order_in.items:
-        menu = session.get(MenuItem, it.menu_item_name)
-        if not menu:
-            raise HTTPException(status_code=404, detail=f"Menu item {it.menu_item_name} not found")
-
-        # record the line-item
-        oli = OrderLineItem(
-            order_id=order.order_id,
-            menu_item_name=it.menu_item_name,
-            quantity=it.quantity,
-        )
-        session.add(oli)
-        total_income += menu.price * it.quantity
-
-        # look up its recipe, fail fast if missing
-        recipe = session.exec(
-            select(Recipe).where(Recipe.menu_item_name == it.menu_item_name)
-        ).first()
-        if not recipe:
-            raise HTTPException(
-                status_code=400,
-                detail=f"No recipe defined for menu item {it.menu_item_name}"
-            )
-
-        # deduct ingredients
-        for ri in recipe.recipe_ingredients:
-            inv = session.get(InventoryItem, ri.inventory_item_name)
-            inv.amount_in_stock -= ri.quantity * it.quantity
-            total_cost += ri.quantity * it.quantity * inv.price_per_unit
-            session.add(inv)
-
-    # 3) update accounting
-    last = session.exec(
-        select(AccountingEntry).order_by(AccountingEntry.timestamp.desc())
-    ).first()
-    prev_bal = last.balance if last else 0.0
-    new_bal = prev_bal + total_income - total_cost
-    entry = AccountingEntry(timestamp=datetime.utcnow(), balance=new_bal)
-    session.add(entry)
-
-    session.commit()
-    session.refresh(order)
-    return order
-
+    if ORDER_WRITE_MODE == "group":
+        receipt = await order_writer.place(order_in)
+    else:
+        receipt = await session.run_sync(place_order, order_in)
+    analytics.invalidate_live()
+    shift_log.record(current.ssn, EventType.order, receipt.timestamp)  # not awaited
+    return receipt
+
+
+@app.post("/orders/batch", response_model=BatchOrderResp, dependencies=[protected()])
+async def create_order_batch(
+    batch: List[BatchOrder],
+    session: AsyncSession = Depends(get_async_session),
+    current=Depends(get_current_user),
+):
+    """Offline sync: replay orders queued by a POS with their original timestamps."""
+    result = await session.run_sync(place_order_batch, batch)
+    analytics.invalidate_all()
+    for r in result.results:
+        if r.status == "ok":
+            shift_log.record(current.ssn, EventType.order, utc_naive(batch[r.index].client_timestamp))
+    return result
 
 
 # ---- 5) MANAGING EMPLOYEES (manager only) ----
@@ -367,6 +544,7 @@ def update_employee(
     emp = session.get(Employee, ssn)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
+    old_email = emp.email
     if emp_up.name is not None:
         emp.name = emp_up.name
     if emp_up.email is not None:
@@ -377,6 +555,7 @@ def update_employee(
         emp.password_hash = get_password_hash(emp_up.password)
     session.add(emp)
     session.commit()
+    invalidate_principal(old_email, emp_up.email)
     session.refresh(emp)
     return EmployeeRead.from_orm(emp)
 
@@ -394,8 +573,10 @@ def delete_employee(
     emp = session.get(Employee, ssn)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
+    email = emp.email
     session.delete(emp)
     session.commit()
+    invalidate_principal(email)
 
 
 # ---- 6) MANAGING INVENTORY ITEMS ----
@@ -449,6 +630,7 @@ def update_inventory_item(
         setattr(item, k, v)
     session.add(item)
     session.commit()
+    bom_cache.invalidate_inventory_item(name)
     session.refresh(item)
     return item
 
@@ -468,6 +650,7 @@ def delete_inventory_item(
         raise HTTPException(status_code=404, detail="Item not found")
     session.delete(item)
     session.commit()
+    bom_cache.invalidate_inventory_item(name)
 
 
 # DTO for creating/updating a menu item
@@ -517,6 +700,7 @@ def update_menu_item(
         setattr(item, k, v)
     session.add(item)
     session.commit()
+    bom_cache.invalidate_menu_item(name, item_up.name)
     session.refresh(item)
     return item
 
@@ -535,6 +719,7 @@ def delete_menu_item(
         raise HTTPException(404, "Menu item not found")
     session.delete(item)
     session.commit()
+    bom_cache.invalidate_menu_item(name)
     
 ####
 # DTOs for the new endpoints
@@ -569,6 +754,7 @@ def create_recipe(
     r = Recipe(menu_item_name=rc.menu_item_name)
     session.add(r)
     session.commit()
+    bom_cache.invalidate_menu_item(rc.menu_item_name)
     session.refresh(r)
     return r
 
@@ -586,112 +772,279 @@ def create_recipe_ingredient(
     inv = session.get(InventoryItem, ric.inventory_item_name)
     if not inv:
         raise HTTPException(404, detail="Inventory item not found")
+    menu_item_name = r.menu_item_name  # read before commit expires it
     ri = RecipeIngredient(**ric.dict())
     session.add(ri)
     session.commit()
+    bom_cache.invalidate_menu_item(menu_item_name)
     return ri
     
+# DTOs for promotions; times are UTC (naive values are taken as UTC)
+class PromotionUpdate(BaseModel):
+    start_time: datetime
+    end_time: datetime
+    discounted_price: float
+
+class PromotionCreate(PromotionUpdate):
+    menu_item_names: List[str] = []
+
+class PromotionItemCreate(BaseModel):
+    promotion_id: int
+    menu_item_name: str
+
+def _check_promotion(p: PromotionUpdate):
+    if utc_naive(p.end_time) <= utc_naive(p.start_time):
+        raise HTTPException(400, "end_time must be after start_time")
+    if p.discounted_price < 0:
+        raise HTTPException(400, "discounted_price must not be negative")
+
+# ---- (new) MANAGING PROMOTIONS (manager only) ----
+# Every write drops the in-memory price index (see pricing.py).
+
+@app.post(
+    "/promotions/",
+    response_model=Promotion,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[protected(), Depends(require_manager_role)],
+)
+def create_promotion(
+    promo_in: PromotionCreate,
+    session=Depends(get_session),
+):
+    _check_promotion(promo_in)
+    names = set(promo_in.menu_item_names)
+    found = set(session.exec(select(MenuItem.name).where(MenuItem.name.in_(names))).all()) if names else set()
+    if names - found:
+        raise HTTPException(404, f"Menu item {sorted(names - found)[0]} not found")
+    promo = Promotion(
+        start_time=utc_naive(promo_in.start_time),
+        end_time=utc_naive(promo_in.end_time),
+        discounted_price=promo_in.discounted_price,
+    )
+    session.add(promo)
+    session.flush()
+    session.add_all(PromotionItem(promotion_id=promo.promotion_id, menu_item_name=n) for n in sorted(names))
+    session.commit()
+    promotion_index.reload(session)
+    session.refresh(promo)
+    return promo
+
+@app.patch(
+    "/promotions/{promotion_id}",
+    response_model=Promotion,
+    dependencies=[protected(), Depends(require_manager_role)],
+)
+def update_promotion(
+    promotion_id: int,
+    promo_up: PromotionUpdate,
+    session=Depends(get_session),
+):
+    _check_promotion(promo_up)
+    promo = session.get(Promotion, promotion_id)
+    if not promo:
+        raise HTTPException(404, "Promotion not found")
+    promo.start_time = utc_naive(promo_up.start_time)
+    promo.end_time = utc_naive(promo_up.end_time)
+    promo.discounted_price = promo_up.discounted_price
+    session.add(promo)
+    session.commit()
+    promotion_index.reload(session)
+    session.refresh(promo)
+    return promo
+
+@app.delete(
+    "/promotions/{promotion_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[protected(), Depends(require_manager_role)],
+)
+def delete_promotion(
+    promotion_id: int,
+    session=Depends(get_session),
+):
+    promo = session.get(Promotion, promotion_id)
+    if not promo:
+        raise HTTPException(404, "Promotion not found")
+    session.exec(delete(PromotionItem).where(PromotionItem.promotion_id == promotion_id))
+    session.delete(promo)
+    session.commit()
+    promotion_index.reload(session)
+
+@app.post(
+    "/promotion_items/",
+    response_model=PromotionItem,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[protected(), Depends(require_manager_role)],
+)
+def create_promotion_item(
+    item_in: PromotionItemCreate,
+    session=Depends(get_session),
+):
+    if not session.get(Promotion, item_in.promotion_id):
+        raise HTTPException(404, "Promotion not found")
+    if not session.get(MenuItem, item_in.menu_item_name):
+        raise HTTPException(404, "Menu item not found")
+    if session.get(PromotionItem, (item_in.promotion_id, item_in.menu_item_name)):
+        raise HTTPException(400, "Menu item is already in this promotion")
+    item = PromotionItem(**item_in.dict())
+    session.add(item)
+    session.commit()
+    promotion_index.reload(session)
+    session.refresh(item)
+    return item
+
+@app.delete(
+    "/promotion_items/{promotion_id}/{menu_item_name}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[protected(), Depends(require_manager_role)],
+)
+def delete_promotion_item(
+    promotion_id: int,
+    menu_item_name: str,
+    session=Depends(get_session),
+):
+    item = session.get(PromotionItem, (promotion_id, menu_item_name))
+    if not item:
+        raise HTTPException(404, "Promotion item not found")
+    session.delete(item)
+    session.commit()
+    promotion_index.reload(session)
+
+
+# ---- (new) SHIFTS & PAYROLL ----
+# Events go through the batched writer in shiftlog.py.
+
+async def _clock(current, event_type: EventType) -> ShiftEvent:
+    event = ShiftEvent(ssn=current.ssn, event_type=event_type, timestamp=datetime.utcnow())
+    await shift_log.record(event.ssn, event.event_type, event.timestamp)
+    return event
+
+@app.post("/shifts/clock_in", response_model=ShiftEvent, status_code=status.HTTP_201_CREATED)
+async def clock_in(current=Depends(get_current_user)):
+    return await _clock(current, EventType.clock_in)
+
+@app.post("/shifts/clock_out", response_model=ShiftEvent, status_code=status.HTTP_201_CREATED)
+async def clock_out(current=Depends(get_current_user)):
+    return await _clock(current, EventType.clock_out)
+
+@app.get(
+    "/shifts/payroll",
+    response_model=List[PayrollLine],
+    dependencies=[Depends(require_manager_role)],
+)
+async def payroll_report(
+    start: date = Query(..., description="YYYY-MM-DD"),
+    end:   date = Query(..., description="YYYY-MM-DD"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    if end < start:
+        raise HTTPException(400, "end must not be before start")
+    return await session.run_sync(payroll, start, end)
+
+
 # ---- 9) COFFEESHOP ANALYTICS (manager only) ----
+# All three reports read the daily_item_sales rollup (see analytics.py).
 @app.get(
     "/analytics/revenue/",
     dependencies=[Depends(require_manager_role)]
 )
-def revenue_report(
+async def revenue_report(
     start: date = Query(..., description="YYYY-MM-DD"),
     end:   date = Query(..., description="YYYY-MM-DD"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    # total sales income
-    income = session.exec(
-        select(func.sum(OrderLineItem.quantity * MenuItem.price))
-        .join(MenuItem, OrderLineItem.menu_item_name == MenuItem.name)
-        .join(Order, OrderLineItem.order_id == Order.order_id)
-        .where(func.date(Order.timestamp).between(start, end))
-    ).one() or 0
-    # total ingredient cost
-    cost = session.exec(
-        select(func.sum(
-            RecipeIngredient.quantity
-            * OrderLineItem.quantity
-            * InventoryItem.price_per_unit
-        ))
-        .join(Recipe, Recipe.recipe_id == RecipeIngredient.recipe_id)
-        .join(OrderLineItem, OrderLineItem.menu_item_name == Recipe.menu_item_name)
-        .join(Order, OrderLineItem.order_id == Order.order_id)
-        .join(InventoryItem, InventoryItem.name == RecipeIngredient.inventory_item_name)
-        .where(Order.timestamp.between(start, end))
-    ).one() or 0
-    return {"start": start, "end": end, "revenue": income - cost}
+    return await analytics.revenue_report(session, start, end)
 
 @app.get(
     "/analytics/popular/",
     dependencies=[Depends(require_manager_role)]
 )
-def top_k_popular(
+async def top_k_popular(
     month: int = Query(..., ge=1, le=12),
     year:  int = Query(...),
     k:     int = Query(3),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    rows = session.exec(
-        select(
-            OrderLineItem.menu_item_name,
-            func.sum(OrderLineItem.quantity).label("sold")
-        )
-        .join(Order, OrderLineItem.order_id == Order.order_id)
-        .where(
-            func.extract("year", Order.timestamp) == year,
-            func.extract("month", Order.timestamp) == month,
-        )
-        .group_by(OrderLineItem.menu_item_name)
-        .order_by(func.sum(OrderLineItem.quantity).desc())
-        .limit(k)
-    ).all()
-    return [{"name": r.menu_item_name, "sold": r.sold} for r in rows]
+    return await analytics.top_k_popular(session, year, month, k)
 
 
 @app.get(
     "/analytics/top-revenue/",
     dependencies=[Depends(require_manager_role)]
 )
-def top_k_revenue(
+async def top_k_revenue(
     start: date = Query(..., description="YYYY-MM-DD"),
     end:   date = Query(..., description="YYYY-MM-DD"),
     k:     int  = Query(3),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    rows = session.exec(
-        select(
-            OrderLineItem.menu_item_name,
-            func.sum(OrderLineItem.quantity * MenuItem.price).label("revenue")
-        )
-        .join(MenuItem, OrderLineItem.menu_item_name == MenuItem.name)
-        .join(Order, OrderLineItem.order_id == Order.order_id)
-        .where(func.date(Order.timestamp).between(start, end))
-        .group_by(OrderLineItem.menu_item_name)
-        .order_by(func.sum(OrderLineItem.quantity * MenuItem.price).desc())
-        .limit(k)
-    ).all()
-    return [{"name": r.menu_item_name, "revenue": r.revenue} for r in rows]
+    return await analytics.top_k_revenue(session, start, end, k)
+
+
+@app.get(
+    "/analytics/cache/stats",
+    dependencies=[Depends(require_manager_role)]
+)
+def analytics_cache_stats():
+    return analytics.cache_stats()
+
+
+# Staffing coverage (see staffing.py): GET uses the stored schedule, POST
+# evaluates draft shifts from the schedule page without saving them.
+@app.get(
+    "/analytics/staffing/",
+    response_model=StaffingReport,
+    dependencies=[Depends(require_manager_role)]
+)
+async def staffing_coverage(session: AsyncSession = Depends(get_async_session)):
+    return await session.run_sync(coverage)
+
+@app.post(
+    "/analytics/staffing/",
+    response_model=StaffingReport,
+    dependencies=[Depends(require_manager_role)]
+)
+async def staffing_coverage_draft(
+    shifts: List[ShiftDraft],
+    session: AsyncSession = Depends(get_async_session),
+):
+    drafts = [(s.day_of_week, s.start_time, s.end_time) for s in shifts]
+    return await session.run_sync(coverage, drafts)
+
+class RollupRebuild(BaseModel):
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+
+@app.post(
+    "/analytics/rollup/rebuild",
+    dependencies=[Depends(require_manager_role)]
+)
+async def rebuild_rollup(
+    body: RollupRebuild,
+    session: AsyncSession = Depends(get_async_session),
+):
+    rows = await session.run_sync(rebuild_daily_item_sales, body.start, body.end)
+    usage_rows = await session.run_sync(rebuild_hourly_usage, body.start, body.end)
+    analytics.invalidate_all()
+    forecast_fits.clear()
+    return {"start": body.start, "end": body.end, "rows": rows, "usage_rows": usage_rows}
     
 @app.get("/llm/description/{drink}", dependencies=[protected()])
-async def drink_description(drink: str):
-    prompt = f"Give me a brief history and serving suggestions for the drink called '{drink}'."
-    resp = httpx.post("http://localhost:11434/api/chat", json={
-        "model": "llama2",
-        "prompt": prompt
-    })
-    resp.raise_for_status()
-    return {"description": resp.json()["choices"][0]["message"]["content"]}
+async def drink_description(
+    drink: str,
+    refresh: bool = Query(False, description="regenerate instead of serving the stored text"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return {"description": await llm.describe(session, drink, refresh)}
 
 @app.post("/llm/suggest/", dependencies=[protected()])
-async def order_suggestions(order: OrderCreate):
-    # development stub: always suggest these three
-    return {"suggestions": [
-        "Cappuccino – a creamy classic",
-        "Hot Chocolate – perfect for chocolate lovers",
-        "Boba – a sweet, chewy pearl tea that adds a fun texture to any order"
-    ]}
+async def order_suggestions(
+    order: OrderCreate,
+    session: AsyncSession = Depends(get_async_session),
+):
+    # co-occurrence over order history, in stock only (see recommender.py)
+    cart = [line.menu_item_name for line in order.items]
+    return {"suggestions": await recommender.suggest(session, cart)}
     
 # allow your front-end origin (or "*" for dev only)
 app.add_middleware(
@@ -699,5 +1052,9 @@ app.add_middleware(
     allow_origins=["http://localhost:3000"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
     allow_credentials=True,
 )
+
+if QUERY_BUDGET_CHECK:
+    app.add_middleware(QueryBudgetMiddleware)
@@ -0,0 +1,172 @@
+# metrics.py
+#
+# In-process metrics, served at GET /metrics in the Prometheus text format.
+# Everything is per worker process; Prometheus sums across targets.
+
+import bisect
+import threading
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# statements per request
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram (Prometheus bucket semantics)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def cumulative(self):
+        """[(upper bound, observations <= bound)], ending with +Inf."""
+        with self._lock:
+            counts = list(self._counts)
+        out, running = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            out.append((bound, running))
+        return out
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (0 when empty)."""
+        cumulative = self.cumulative()
+        total = cumulative[-1][1]
+        if not total:
+            return 0.0
+        rank = q * total
+        for bound, running in cumulative:
+            if running >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {str(b): n for b, n in self.cumulative()},
+        }
+
+
+class RequestStats:
+    """SQL issued while serving one request; filled in by the engine hooks in database.py."""
+
+    __slots__ = ("statements", "sql_seconds", "shapes")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.shapes = None  # Counter of statement text, when query_budget is checking
+
+
+# Set by the HTTP middleware in main.py. The object (not the variable) is
+# mutated, so statements run on threadpool workers or in AsyncSession
+# greenlets still land on the request that started them.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _labels(**labels) -> str:
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels.items()
+    )
+    return "{" + inner + "}" if inner else ""
+
+
+def _number(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def histogram_lines(name: str, hist: Histogram, **labels) -> List[str]:
+    lines = [
+        f"{name}_bucket{_labels(**labels, le=_number(bound))} {n}"
+        for bound, n in hist.cumulative()
+    ]
+    lines.append(f"{name}_sum{_labels(**labels)} {_number(hist.sum)}")
+    lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+    return lines
+
+
+def family(name: str, kind: str, help_text: str, samples: Iterable[str]) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *samples]
+
+
+class RouteMetrics:
+    """Request count, latency and SQL usage per (method, route template)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.sql_statements: Dict[Tuple[str, str], Histogram] = {}
+        self.sql_seconds: Dict[Tuple[str, str], float] = {}
+
+    def record(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram()
+                self.sql_statements[key] = Histogram(SQL_COUNT_BUCKETS)
+                self.sql_seconds[key] = 0.0
+            self.sql_seconds[key] += stats.sql_seconds
+            latency, statements = self.latency[key], self.sql_statements[key]
+        latency.observe(seconds)
+        statements.observe(stats.statements)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            requests = sorted(self.requests.items())
+            keys = sorted(self.latency)
+            sql_seconds = dict(self.sql_seconds)
+        out = family(
+            "coffee_http_requests_total", "counter", "Requests served, by route and status.",
+            (f"coffee_http_requests_total{_labels(method=m, route=r, status=s)} {n}"
+             for (m, r, s), n in requests),
+        )
+        out += family(
+            "coffee_http_request_duration_seconds", "histogram", "Request latency.",
+            (line for m, r in keys
+             for line in histogram_lines("coffee_http_request_duration_seconds",
+                                         self.latency[(m, r)], method=m, route=r)),
+        )
+        out += family(
+            "coffee_http_request_duration_quantile_seconds", "gauge",
+            "Bucket upper bound holding the p50/p95/p99 request latency since start.",
+            (f"coffee_http_request_duration_quantile_seconds"
+             f"{_labels(method=m, route=r, quantile=q)} {_number(self.latency[(m, r)].quantile(q))}"
+             for m, r in keys for q in QUANTILES),
+        )
+        out += family(
+            "coffee_http_request_sql_statements", "histogram", "SQL statements executed per request.",
+            (line for m, r in keys
+             for line in histogram_lines("coffee_http_request_sql_statements",
+                                         self.sql_statements[(m, r)], method=m, route=r)),
+        )
+        out += family(
+            "coffee_http_request_sql_seconds_total", "counter",
+            "Time spent executing SQL statements, by route.",
+            (f"coffee_http_request_sql_seconds_total{_labels(method=m, route=r)} "
+             f"{_number(sql_seconds[(m, r)])}" for m, r in keys),
+        )
+        return out
+
+
+route_metrics = RouteMetrics()
@@ -0,0 +1,32 @@
+-- ============================
+-- 001: ledger head + entry ids
+-- ============================
+-- accounting_entry was keyed by timestamp; give it a surrogate key, store
+-- the delta of each entry, and keep the running balance in ledger_head.
+
+BEGIN;
+
+ALTER TABLE accounting_entry DROP CONSTRAINT IF EXISTS accounting_entry_pkey;
+ALTER TABLE accounting_entry ADD COLUMN IF NOT EXISTS entry_id SERIAL PRIMARY KEY;
+ALTER TABLE accounting_entry ADD COLUMN IF NOT EXISTS delta DOUBLE PRECISION NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS ix_accounting_entry_timestamp ON accounting_entry(timestamp);
+
+UPDATE accounting_entry e
+SET delta = d.delta
+FROM (
+  SELECT entry_id,
+         balance - COALESCE(LAG(balance) OVER (ORDER BY timestamp, entry_id), 0) AS delta
+  FROM accounting_entry
+) d
+WHERE d.entry_id = e.entry_id;
+
+CREATE TABLE IF NOT EXISTS ledger_head (
+  id       INTEGER           PRIMARY KEY,
+  balance  DOUBLE PRECISION  NOT NULL
+);
+INSERT INTO ledger_head (id, balance)
+SELECT 1, COALESCE(
+  (SELECT balance FROM accounting_entry ORDER BY timestamp DESC, entry_id DESC LIMIT 1), 0)
+ON CONFLICT (id) DO NOTHING;
+
+COMMIT;
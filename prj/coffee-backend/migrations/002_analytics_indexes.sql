@@ -0,0 +1,8 @@
+-- ============================
+-- 002: indexes for analytics
+-- ============================
+-- The ORM models declare these; create_all does not add them to existing tables.
+
+CREATE INDEX IF NOT EXISTS ix_order_timestamp ON "order"(timestamp);
+CREATE INDEX IF NOT EXISTS ix_order_line_item_menu_item_order
+  ON order_line_item(menu_item_name, order_id, quantity);
@@ -0,0 +1,18 @@
+-- ============================
+-- 003: price charged per line
+-- ============================
+-- Orders now record the price actually charged (promotions applied). Lines
+-- written before this change were charged the list price.
+
+BEGIN;
+
+ALTER TABLE order_line_item ADD COLUMN IF NOT EXISTS unit_price DOUBLE PRECISION;
+
+UPDATE order_line_item li
+SET unit_price = m.price
+FROM menu_item m
+WHERE m.name = li.menu_item_name AND li.unit_price IS NULL;
+
+ALTER TABLE order_line_item ALTER COLUMN unit_price SET NOT NULL;
+
+COMMIT;
@@ -0,0 +1,27 @@
+-- ============================
+-- 004: ingredient cost per line
+-- ============================
+-- Orders now record the ingredient cost of each item when it was ordered,
+-- so reports and rollup rebuilds no longer price history at today's supplier
+-- prices. What older lines cost was never stored; they are backfilled from
+-- the current recipes and prices, which is what the reports used until now.
+
+BEGIN;
+
+ALTER TABLE order_line_item ADD COLUMN IF NOT EXISTS unit_cost DOUBLE PRECISION;
+
+UPDATE order_line_item li
+SET unit_cost = COALESCE(c.cost, 0)
+FROM (
+  SELECT m.name AS menu_item_name, SUM(ri.quantity * ii.price_per_unit) AS cost
+  FROM menu_item m
+  LEFT JOIN recipe r ON r.menu_item_name = m.name
+  LEFT JOIN recipe_ingredient ri ON ri.recipe_id = r.recipe_id
+  LEFT JOIN inventory_item ii ON ii.name = ri.inventory_item_name
+  GROUP BY m.name
+) c
+WHERE c.menu_item_name = li.menu_item_name AND li.unit_cost IS NULL;
+
+ALTER TABLE order_line_item ALTER COLUMN unit_cost SET NOT NULL;
+
+COMMIT;
@@ -0,0 +1,8 @@
+-- ============================
+-- 005: shift_log by employee and time
+-- ============================
+-- Payroll reads each employee's events in time order; the composite index
+-- also serves the lookups the single-column ssn index did.
+
+CREATE INDEX IF NOT EXISTS ix_shift_log_ssn_timestamp ON shift_log(ssn, timestamp);
+DROP INDEX IF EXISTS ix_shift_log_ssn;
@@ -0,0 +1,36 @@
+-- ============================
+-- 006: ledger checkpoints
+-- ============================
+-- Open/low/high/close balance per hour and per day, for the balance history
+-- endpoint. New entries maintain it (ledger.post_entry); this fills it from
+-- the existing entries. Run it with the app stopped: it recomputes every
+-- checkpoint, including any the app wrote after create_all made the table.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ledger_checkpoint (
+  resolution  VARCHAR           NOT NULL,
+  bucket      TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+  open        DOUBLE PRECISION  NOT NULL,
+  low         DOUBLE PRECISION  NOT NULL,
+  high        DOUBLE PRECISION  NOT NULL,
+  close       DOUBLE PRECISION  NOT NULL,
+  entries     INTEGER           NOT NULL,
+  PRIMARY KEY (resolution, bucket)
+);
+
+DELETE FROM ledger_checkpoint;
+
+INSERT INTO ledger_checkpoint (resolution, bucket, open, low, high, close, entries)
+SELECT r.resolution,
+       date_trunc(r.resolution, e.timestamp) AS bucket,
+       (array_agg(e.balance - e.delta ORDER BY e.timestamp, e.entry_id))[1],
+       MIN(LEAST(e.balance, e.balance - e.delta)),
+       MAX(GREATEST(e.balance, e.balance - e.delta)),
+       (array_agg(e.balance ORDER BY e.timestamp DESC, e.entry_id DESC))[1],
+       COUNT(*)
+FROM accounting_entry e
+CROSS JOIN (VALUES ('hour'), ('day')) AS r(resolution)
+GROUP BY r.resolution, date_trunc(r.resolution, e.timestamp);
+
+COMMIT;
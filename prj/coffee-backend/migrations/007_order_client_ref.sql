@@ -0,0 +1,13 @@
+-- ============================
+-- 007: POS ticket reference per order
+-- ============================
+-- POST /orders/batch stores each ticket's client_ref and skips tickets
+-- already applied, so a POS retrying a sync does not double-book orders.
+-- Orders placed before this change (and through POST /orders/) have none.
+
+BEGIN;
+
+ALTER TABLE "order" ADD COLUMN IF NOT EXISTS client_ref TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS ix_order_client_ref ON "order"(client_ref);
+
+COMMIT;
@@ -0,0 +1,14 @@
+-- ============================
+-- 008: narrow the per-item line index
+-- ============================
+-- 002 indexed order_line_item(menu_item_name, order_id, quantity) so
+-- per-item scans could skip the table. Every line read now also needs
+-- unit_price and unit_cost and goes through the primary key by order_id,
+-- so only the foreign-key lookup by menu item still uses the index.
+
+BEGIN;
+
+DROP INDEX IF EXISTS ix_order_line_item_menu_item_order;
+CREATE INDEX IF NOT EXISTS ix_order_line_item_menu_item ON order_line_item(menu_item_name);
+
+COMMIT;
@@ -1,8 +1,8 @@
 from typing import Optional, List, Literal
-from datetime import datetime, time
+from datetime import date, datetime, time
 from pydantic import BaseModel
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from enum import Enum
 from sqlalchemy.dialects.postgresql import ENUM as PGEnum
 
@@ -59,9 +59,28 @@ class WorkSchedule(SQLModel, table=True):
 
 class AccountingEntry(SQLModel, table=True):
     __tablename__ = "accounting_entry"
-    timestamp: datetime = Field(primary_key=True)
+    entry_id: Optional[int] = Field(default=None, primary_key=True)
+    timestamp: datetime = Field(nullable=False, index=True)
+    delta: float = Field(default=0.0, nullable=False)
     balance: float = Field(nullable=False)
 
+class LedgerHead(SQLModel, table=True):
+    """Single row holding the running balance; every entry increments it."""
+    __tablename__ = "ledger_head"
+    id: int = Field(default=1, primary_key=True)
+    balance: float = Field(default=0.0, nullable=False)
+
+class LedgerCheckpoint(SQLModel, table=True):
+    """Balance range per hour and per day (UTC), kept current by post_entry for charting."""
+    __tablename__ = "ledger_checkpoint"
+    resolution: str = Field(primary_key=True)   # "hour" or "day"
+    bucket: datetime = Field(primary_key=True)  # start of the hour / day
+    open: float = Field(nullable=False)         # balance before the bucket's first entry
+    low: float = Field(nullable=False)
+    high: float = Field(nullable=False)
+    close: float = Field(nullable=False)        # balance after its last entry
+    entries: int = Field(default=0, nullable=False)
+
 class InventoryItem(SQLModel, table=True):
     __tablename__ = "inventory_item"
     name: str = Field(primary_key=True)
@@ -117,20 +136,53 @@ class RecipeIngredient(SQLModel, table=True):
 class Order(SQLModel, table=True):
     __tablename__ = "order"
     order_id: int = Field(primary_key=True)
-    timestamp: datetime = Field(nullable=False)
+    timestamp: datetime = Field(nullable=False, index=True)
     payment_method: str = Field(nullable=False)
+    # set by POST /orders/batch so a resent ticket is not applied twice
+    client_ref: Optional[str] = Field(default=None, unique=True, index=True)
 
     line_items: List["OrderLineItem"] = Relationship(back_populates="order")
 
 class OrderLineItem(SQLModel, table=True):
     __tablename__ = "order_line_item"
+    __table_args__ = (
+        # foreign-key checks when a menu item is deleted; reads go through the PK
+        Index("ix_order_line_item_menu_item", "menu_item_name"),
+    )
     order_id: int = Field(foreign_key="order.order_id", primary_key=True)
     menu_item_name: str = Field(foreign_key="menu_item.name", primary_key=True)
     quantity: int = Field(nullable=False)
+    unit_price: float = Field(nullable=False)  # charged, after promotions
+    unit_cost: float = Field(nullable=False)   # ingredient cost of one, when ordered
 
     order: Order = Relationship(back_populates="line_items")
     menu_item: MenuItem = Relationship(back_populates="order_line_items")
 
+class DailyItemSales(SQLModel, table=True):
+    """Per-day, per-menu-item rollup kept current by the order path (see rollup.py)."""
+    __tablename__ = "daily_item_sales"
+    sales_date: date = Field(primary_key=True)
+    menu_item_name: str = Field(primary_key=True)
+    quantity: int = Field(default=0, nullable=False)
+    revenue: float = Field(default=0.0, nullable=False)
+    ingredient_cost: float = Field(default=0.0, nullable=False)
+
+class HourlyIngredientUsage(SQLModel, table=True):
+    """Ingredient consumed per hour (UTC), kept current by the order path (see rollup.py)."""
+    __tablename__ = "hourly_ingredient_usage"
+    hour: datetime = Field(primary_key=True)
+    inventory_item_name: str = Field(primary_key=True)
+    quantity: float = Field(default=0.0, nullable=False)
+
+class DrinkDescription(SQLModel, table=True):
+    """Generated drink descriptions, cached per drink and LLM model (see llm.py)."""
+    __tablename__ = "drink_description"
+    drink: str = Field(primary_key=True)
+    model: str = Field(primary_key=True)
+    description: str = Field(nullable=False)
+    created_at: datetime = Field(nullable=False)
+    last_used_at: datetime = Field(nullable=False, index=True)
+
 class Promotion(SQLModel, table=True):
     __tablename__ = "promotion"
     promotion_id: int = Field(primary_key=True)
@@ -156,12 +208,15 @@ class EventType(str, Enum):
 
 class ShiftLog(SQLModel, table=True):
     __tablename__ = "shift_log"
+    __table_args__ = (
+        # payroll walks each employee's events in time order
+        Index("ix_shift_log_ssn_timestamp", "ssn", "timestamp"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     ssn: str = Field(
         foreign_key="employee.ssn",
         nullable=False,
-        index=True,
     )
     event_type: EventType = Field(
         sa_column=Column(
@@ -207,3 +262,106 @@ class InventoryItemUpdate(BaseModel):
     unit: Optional[str] = None
     price_per_unit: Optional[float] = None
     amount_in_stock: Optional[float] = None
+
+class OrderItem(BaseModel):
+    menu_item_name: str
+    quantity: int
+
+class OrderCreate(BaseModel):
+    items: List[OrderItem]
+    payment_method: str
+
+class LowStockItem(BaseModel):
+    name: str
+    amount_in_stock: float
+
+class OrderRead(BaseModel):
+    order_id: int
+    timestamp: datetime
+    payment_method: str
+    low_stock: List[LowStockItem] = []
+
+class BatchOrder(OrderCreate):
+    client_timestamp: datetime
+    client_ref: Optional[str] = None
+
+class BatchOrderResult(BaseModel):
+    index: int
+    client_ref: Optional[str] = None
+    status: Literal["ok", "error", "duplicate"]
+    order_id: Optional[int] = None  # for a duplicate, the order applied earlier
+    detail: Optional[str] = None
+
+class BatchOrderResp(BaseModel):
+    accepted: int
+    rejected: int
+    duplicates: int = 0
+    results: List[BatchOrderResult]
+    low_stock: List[LowStockItem] = []
+
+class Principal(BaseModel):
+    """The authenticated employee as seen by the auth layer (no password hash)."""
+    ssn: str
+    name: str
+    email: str
+    salary: float
+    role: Literal["manager", "barista"]
+
+class ShiftEvent(BaseModel):
+    ssn: str
+    event_type: EventType
+    timestamp: datetime
+
+class PayrollLine(BaseModel):
+    ssn: str
+    name: str
+    hours: float
+    hourly_rate: float            # Employee.salary
+    cost: float
+    shifts: int
+    unpaired_clock_ins: int       # clock_in with no clock_out within PAYROLL_MAX_SHIFT_HOURS
+
+class ShiftDraft(BaseModel):
+    """A WorkSchedule row being edited; only the times matter for coverage."""
+    ssn: Optional[str] = None
+    day_of_week: str              # 1-7 (Monday = 1) or a day name
+    start_time: time
+    end_time: time                # at or before start_time: runs past midnight
+
+class StaffingSlot(BaseModel):
+    day_of_week: int              # Monday = 1
+    start: time
+    staff: float                  # baristas on duty, averaged over the bucket
+    orders: float                 # average orders in this bucket per week
+    orders_per_barista: Optional[float]  # None when nobody is on duty
+    needed: int
+    status: Literal["under", "ok", "over"]
+
+class StaffingReport(BaseModel):
+    bucket_minutes: int
+    weeks: int
+    orders_per_barista_capacity: float
+    understaffed: int
+    overstaffed: int
+    slots: List[StaffingSlot]
+
+class BalancePoint(BaseModel):
+    start: datetime
+    open: float
+    low: float
+    high: float
+    close: float
+    entries: int
+
+class BalanceHistory(BaseModel):
+    resolution: Literal["hour", "day"]  # checkpoints the points were merged from
+    points: List[BalancePoint]          # buckets with no entries are omitted
+
+class StockForecast(BaseModel):
+    name: str
+    unit: str
+    amount_in_stock: float
+    daily_rate: float                     # expected use per day, averaged over a week
+    days_until_stockout: Optional[float]  # None: not used up within the horizon
+    stockout_at: Optional[datetime]
+    suggested_refill: float
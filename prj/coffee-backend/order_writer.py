@@ -0,0 +1,156 @@
+# order_writer.py
+#
+# Group-commit mode for POST /orders/ (ORDER_WRITE_MODE=group).
+#
+# In the default "direct" mode every order is its own transaction, so every
+# ticket waits for one commit (and one fsync on the database). In group mode
+# the request only queues the ticket. One background task per worker writes
+# the queued tickets in arrival order and commits up to ORDER_GROUP_MAX of
+# them at once. Each request gets its receipt once its group is committed.
+# A response therefore still means the order is durable. Only the commit is
+# shared: each ticket is written exactly as in direct mode, with its own
+# stock deduction and ledger entry, in queue order, so order ids and
+# balances come out the same.
+#
+# Tickets arriving while a commit is in flight form the next group, so
+# groups grow with load without any waiting. ORDER_GROUP_WINDOW_MS
+# additionally holds each group open that long to collect more tickets
+# (like Postgres' commit_delay). Beyond ORDER_QUEUE_SIZE waiting tickets,
+# requests get 503 with Retry-After.
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+from fastapi import HTTPException, status
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_engine
+from models import OrderCreate, OrderRead
+from orders import Ticket, validate_orders, write_ticket
+
+ORDER_WRITE_MODE = os.getenv("ORDER_WRITE_MODE", "direct").lower()
+ORDER_GROUP_MAX = int(os.getenv("ORDER_GROUP_MAX", "100"))
+ORDER_GROUP_WINDOW_MS = float(os.getenv("ORDER_GROUP_WINDOW_MS", "0"))
+ORDER_QUEUE_SIZE = int(os.getenv("ORDER_QUEUE_SIZE", "10000"))
+ORDER_RETRY_AFTER = int(os.getenv("ORDER_RETRY_AFTER", "1"))
+
+log = logging.getLogger("coffee.order_writer")
+
+
+def write_group(session: Session, orders: List[OrderCreate]) -> List[Union[OrderRead, Exception]]:
+    """
+    Write tickets in order, one commit per group. Returns a receipt or the
+    exception for each ticket.
+
+    Every ticket is validated and priced first, against one menu read for
+    the whole group. An invalid ticket (unknown item, no recipe, bad
+    quantity) fails on its own and costs the others nothing. A ticket
+    rejected while writing (out of stock under the reject policy, a
+    constraint violation) rolls back the whole transaction. The tickets
+    before it are written again and committed without it, and the ones
+    after it start a new group. Replaying costs one extra commit per
+    rejection. A savepoint per ticket would cost two more statements on
+    every ticket instead.
+    """
+    outcomes: List[Union[Ticket, OrderRead, Exception]] = validate_orders(session, orders, datetime.utcnow())
+    segments = [[i for i, outcome in enumerate(outcomes) if isinstance(outcome, Ticket)]]
+    tickets = {i: outcomes[i] for i in segments[0]}
+    while segments:
+        segment = segments.pop(0)
+        written: List[Tuple[int, Union[OrderRead, Exception]]] = []
+        for k, i in enumerate(segment):
+            try:
+                written.append((i, write_ticket(session, tickets[i])))
+            except Exception as exc:
+                session.rollback()
+                outcomes[i] = exc
+                segments[:0] = [segment[:k], segment[k + 1:]]
+                break
+        else:
+            if not written:
+                continue
+            try:
+                session.commit()
+            except Exception as exc:
+                session.rollback()
+                written = [(i, exc) for i, _ in written]
+            for i, outcome in written:
+                outcomes[i] = outcome
+    return outcomes
+
+
+class OrderWriter:
+    def __init__(self):
+        self._pending: List[Tuple[OrderCreate, asyncio.Future]] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def start(self):
+        """Called on startup, outside any request, so the writer's SQL is not billed to one."""
+        if self._task is None:
+            self._wake, self._full = asyncio.Event(), asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def place(self, order_in: OrderCreate) -> OrderRead:
+        """Queue a ticket and wait until its group is committed."""
+        if len(self._pending) >= ORDER_QUEUE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many orders waiting to be written, retry shortly",
+                headers={"Retry-After": str(ORDER_RETRY_AFTER)},
+            )
+        done = asyncio.get_running_loop().create_future()
+        self._pending.append((order_in, done))
+        self._wake.set()
+        if len(self._pending) >= ORDER_GROUP_MAX:
+            self._full.set()
+        return await done
+
+    async def _run(self):
+        while not self._closing:
+            await self._wake.wait()
+            if ORDER_GROUP_WINDOW_MS > 0 and not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), ORDER_GROUP_WINDOW_MS / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._pending:
+            batch, self._pending = self._pending[:ORDER_GROUP_MAX], self._pending[ORDER_GROUP_MAX:]
+            try:
+                async with AsyncSession(async_engine) as session:
+                    outcomes = await session.run_sync(write_group, [order_in for order_in, _ in batch])
+            except Exception as exc:
+                log.exception("failed to write %d orders", len(batch))
+                outcomes = [exc] * len(batch)
+            for (_, done), outcome in zip(batch, outcomes):
+                if done.done():
+                    continue  # request cancelled; nobody is waiting
+                if isinstance(outcome, Exception):
+                    done.set_exception(outcome)
+                else:
+                    done.set_result(outcome)
+
+    async def close(self):
+        """Called on shutdown: write whatever is queued, then stop."""
+        if self._task is not None:
+            self._closing = True
+            self._wake.set()
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+order_writer = OrderWriter()
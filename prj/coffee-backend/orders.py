@@ -0,0 +1,365 @@
+# orders.py
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models import (
+    BatchOrder,
+    BatchOrderResp,
+    BatchOrderResult,
+    InventoryItem,
+    MenuItem,
+    Order,
+    OrderCreate,
+    OrderItem,
+    OrderLineItem,
+    OrderRead,
+)
+from bom_cache import Bom, bom_cache
+from inventory import STOCK_POLICY, deduct_stock
+from ledger import post_entry
+from pricing import promotion_index
+from rollup import ItemSales, hour_of, record_sales, record_usage
+from timeutil import utc_naive
+
+MAX_BATCH_ORDERS = 10000
+
+
+def merge_lines(items: List[OrderItem]) -> Dict[str, int]:
+    """Collapse repeated menu items into one line (the line-item PK is per item)."""
+    if not items:
+        raise HTTPException(status_code=400, detail="Order has no items")
+    lines: Dict[str, int] = defaultdict(int)
+    for it in items:
+        if it.quantity <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Quantity for {it.menu_item_name} must be positive",
+            )
+        lines[it.menu_item_name] += it.quantity
+    return dict(lines)
+
+
+def load_menu(session: Session, names) -> Tuple[Dict[str, float], Dict[str, Bom]]:
+    """List prices from the database and recipes from the BOM cache."""
+    names = list(names)
+    prices = dict(
+        session.exec(
+            select(MenuItem.name, MenuItem.price).where(MenuItem.name.in_(names))
+        ).all()
+    )
+    return prices, bom_cache.get_many(session, names)
+
+
+class Pricing(NamedTuple):
+    income: float
+    cost: float
+    unit_prices: Dict[str, float]  # menu item -> price charged, promotions applied
+    unit_costs: Dict[str, float]   # menu item -> ingredient cost of one; see add_costs
+    usage: Dict[str, float]       # inventory item -> amount used
+    items: Dict[str, ItemSales]   # menu item -> what this ticket adds to the rollup
+
+
+def price_lines(
+    lines: Dict[str, int], prices: Dict[str, float], boms: Dict[str, Bom], at: datetime
+) -> Pricing:
+    """
+    Validate a ticket against the menu; return its totals at the prices in
+    effect at `at`, and its ingredient usage. Ingredient costs are left at
+    zero until add_costs.
+    """
+    for name in lines:
+        if name not in prices:
+            raise HTTPException(status_code=404, detail=f"Menu item {name} not found")
+        if boms.get(name) is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No recipe defined for menu item {name}",
+            )
+    usage: Dict[str, float] = defaultdict(float)
+    items: Dict[str, ItemSales] = {}
+    unit_prices = {name: promotion_index.price(name, at, prices[name]) for name in lines}
+    for name, qty in lines.items():
+        for line in boms[name]:
+            usage[line.inventory_item_name] += line.quantity * qty
+        items[name] = ItemSales(qty, unit_prices[name] * qty, 0.0)
+    return Pricing(
+        income=sum(s.revenue for s in items.values()),
+        cost=0.0,
+        unit_prices=unit_prices,
+        unit_costs={name: 0.0 for name in lines},
+        usage=dict(usage),
+        items=items,
+    )
+
+
+def add_costs(pricing: Pricing, boms: Dict[str, Bom], ingredient_prices: Dict[str, float]) -> Pricing:
+    """
+    Fill in ingredient costs at `ingredient_prices`, the prices returned by
+    the stock update in the same transaction (never cached ones).
+    """
+    unit_costs = {
+        name: sum(line.quantity * ingredient_prices[line.inventory_item_name] for line in boms[name])
+        for name in pricing.items
+    }
+    items = {
+        name: s._replace(ingredient_cost=unit_costs[name] * s.quantity)
+        for name, s in pricing.items.items()
+    }
+    return pricing._replace(
+        cost=sum(s.ingredient_cost for s in items.values()),
+        unit_costs=unit_costs,
+        items=items,
+    )
+
+
+def place_order(session: Session, order_in: OrderCreate) -> OrderRead:
+    """Validate and write a whole ticket in a single transaction."""
+    receipt = write_order(session, order_in)
+    session.commit()
+    return receipt
+
+
+class Ticket(NamedTuple):
+    """A validated, priced ticket, ready to write."""
+    order_in: OrderCreate
+    lines: Dict[str, int]
+    boms: Dict[str, Bom]
+    pricing: Pricing
+    at: datetime
+
+
+def validate_orders(
+    session: Session, orders: List[OrderCreate], now: datetime
+) -> List[Union[Ticket, HTTPException]]:
+    """
+    Merge and price tickets against one menu read. Returns a Ticket for each
+    valid one and the HTTPException for each invalid one. Nothing is written.
+    """
+    outcomes: List[Union[Ticket, HTTPException, None]] = [None] * len(orders)
+    merged: Dict[int, Dict[str, int]] = {}
+    for i, order_in in enumerate(orders):
+        try:
+            merged[i] = merge_lines(order_in.items)
+        except HTTPException as exc:
+            outcomes[i] = exc
+    if not merged:
+        return outcomes
+    prices, boms = load_menu(session, {n for lines in merged.values() for n in lines})
+    for i, lines in merged.items():
+        try:
+            outcomes[i] = Ticket(orders[i], lines, boms, price_lines(lines, prices, boms, now), now)
+        except HTTPException as exc:
+            outcomes[i] = exc
+    return outcomes
+
+
+def write_order(session: Session, order_in: OrderCreate) -> OrderRead:
+    """Validate one ticket and write it into the session's transaction without committing."""
+    outcome = validate_orders(session, [order_in], datetime.utcnow())[0]
+    if isinstance(outcome, HTTPException):
+        raise outcome
+    return write_ticket(session, outcome)
+
+
+def write_ticket(session: Session, ticket: Ticket) -> OrderRead:
+    """
+    Write one validated ticket into the session's transaction without
+    committing.
+
+    The query count is fixed regardless of the number of lines: one query
+    for the menu prices (in validate_orders), one UPDATE .. RETURNING for
+    the stock, one for the ledger head, then the inserts. Recipes are read
+    from bom_cache and only hit the database on a cache miss.
+    """
+    order_in, lines, boms, pricing, now = ticket
+
+    # 1) net usage per ingredient for the whole ticket; the update returns
+    #    the ingredient prices the ticket is costed at
+    low_stock, ingredient_prices = deduct_stock(session, pricing.usage)
+    pricing = add_costs(pricing, boms, ingredient_prices)
+
+    # 2) header + line items, flushed together
+    order = Order(timestamp=now, payment_method=order_in.payment_method)
+    session.add(order)
+    session.flush()
+    session.add_all(
+        OrderLineItem(
+            order_id=order.order_id,
+            menu_item_name=name,
+            quantity=qty,
+            unit_price=pricing.unit_prices[name],
+            unit_cost=pricing.unit_costs[name],
+        )
+        for name, qty in lines.items()
+    )
+
+    # 3) analytics rollup, then accounting last so the ledger head is locked
+    #    only until commit
+    record_sales(session, {(now.date(), name): s for name, s in pricing.items.items()})
+    record_usage(session, {(hour_of(now), name): qty for name, qty in pricing.usage.items()})
+    post_entry(session, pricing.income - pricing.cost, now)
+
+    return OrderRead(
+        order_id=order.order_id,
+        timestamp=order.timestamp,
+        payment_method=order.payment_method,
+        low_stock=low_stock,
+    )
+
+
+def place_order_batch(session: Session, batch: List[BatchOrder]) -> BatchOrderResp:
+    """
+    Replay queued POS orders in one transaction.
+
+    Every order is validated against one menu/recipe snapshot; invalid ones
+    are reported and skipped. The valid ones are written with one bulk
+    insert for headers and one for line items, a single net stock deduction
+    and a single aggregated ledger entry. Orders whose client_ref was already
+    applied (a POS retrying after a lost response) are reported as
+    duplicates and not written again.
+    """
+    if len(batch) > MAX_BATCH_ORDERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_ORDERS} orders per batch",
+        )
+    results = [
+        BatchOrderResult(index=i, client_ref=o.client_ref, status="ok")
+        for i, o in enumerate(batch)
+    ]
+
+    # 0) skip tickets applied by an earlier sync, or repeated in this one
+    refs = {o.client_ref for o in batch if o.client_ref is not None}
+    applied: Dict[str, int] = dict(
+        session.exec(
+            select(Order.client_ref, Order.order_id).where(Order.client_ref.in_(list(refs)))
+        ).all()
+    ) if refs else {}
+    first_with_ref: Dict[str, int] = {}
+    for i, o in enumerate(batch):
+        if o.client_ref is None:
+            continue
+        if o.client_ref in applied or o.client_ref in first_with_ref:
+            results[i].status, results[i].order_id = "duplicate", applied.get(o.client_ref)
+        else:
+            first_with_ref[o.client_ref] = i
+    duplicates = sum(r.status == "duplicate" for r in results)
+
+    # 1) merge lines, then load the menu once for the whole batch
+    tickets: Dict[int, Dict[str, int]] = {}
+    for i, o in enumerate(batch):
+        if results[i].status == "duplicate":
+            continue
+        try:
+            tickets[i] = merge_lines(o.items)
+        except HTTPException as exc:
+            results[i].status, results[i].detail = "error", exc.detail
+    prices, boms = load_menu(session, {n for lines in tickets.values() for n in lines})
+
+    priced: Dict[int, Pricing] = {}
+    for i, lines in tickets.items():
+        try:
+            priced[i] = price_lines(lines, prices, boms, utc_naive(batch[i].client_timestamp))
+        except HTTPException as exc:
+            results[i].status, results[i].detail = "error", exc.detail
+
+    # 2) with the reject policy, replay orders in sequence against a stock snapshot
+    if STOCK_POLICY == "reject" and priced:
+        names = {n for p in priced.values() for n in p.usage}
+        stock = dict(
+            session.exec(
+                select(InventoryItem.name, InventoryItem.amount_in_stock)
+                .where(InventoryItem.name.in_(list(names)))
+            ).all()
+        )
+        for i in sorted(priced, key=lambda i: (utc_naive(batch[i].client_timestamp), i)):
+            usage = priced[i].usage
+            short = next((n for n in sorted(usage) if stock.get(n, 0) < usage[n]), None)
+            if short:
+                del priced[i]
+                results[i].status, results[i].detail = "error", f"Not enough {short} in stock"
+                continue
+            for n, qty in usage.items():
+                stock[n] -= qty
+
+    if not priced:
+        return BatchOrderResp(accepted=0, rejected=len(batch) - duplicates,
+                              duplicates=duplicates, results=results)
+
+    # 3) net deduction per ingredient across all accepted orders
+    net_usage: Dict[str, float] = defaultdict(float)
+    for p in priced.values():
+        for n, qty in p.usage.items():
+            net_usage[n] += qty
+    low_stock, ingredient_prices = deduct_stock(session, net_usage)
+    for i in priced:
+        priced[i] = add_costs(priced[i], boms, ingredient_prices)
+
+    # 4) bulk insert headers (ids come back in parameter order), then line items
+    accepted = sorted(priced)
+    try:
+        order_ids = session.exec(
+            insert(Order).returning(Order.order_id, sort_by_parameter_order=True),
+            params=[
+                {
+                    "timestamp": utc_naive(batch[i].client_timestamp),
+                    "payment_method": batch[i].payment_method,
+                    "client_ref": batch[i].client_ref,
+                }
+                for i in accepted
+            ],
+        ).scalars().all()
+    except IntegrityError as exc:
+        if "client_ref" not in str(exc.orig):
+            raise
+        session.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Some of these orders were applied by a concurrent sync; retry the batch",
+        )
+    line_rows = []
+    for i, order_id in zip(accepted, order_ids):
+        results[i].order_id = order_id
+        for name, qty in tickets[i].items():
+            line_rows.append({
+                "order_id": order_id,
+                "menu_item_name": name,
+                "quantity": qty,
+                "unit_price": priced[i].unit_prices[name],
+                "unit_cost": priced[i].unit_costs[name],
+            })
+    session.exec(insert(OrderLineItem), params=line_rows)
+    for r in results:
+        if r.status == "duplicate" and r.order_id is None:
+            r.order_id = results[first_with_ref[r.client_ref]].order_id
+
+    # 5) rollups per (client day, menu item) and (client hour, ingredient),
+    #    then one ledger entry for the batch
+    sales: Dict[Tuple, ItemSales] = {}
+    usage: Dict[Tuple, float] = defaultdict(float)
+    for i in accepted:
+        ts = utc_naive(batch[i].client_timestamp)
+        for name, s in priced[i].items.items():
+            prev = sales.get((ts.date(), name), ItemSales(0, 0.0, 0.0))
+            sales[(ts.date(), name)] = ItemSales(*(a + b for a, b in zip(prev, s)))
+        for name, qty in priced[i].usage.items():
+            usage[(hour_of(ts), name)] += qty
+    record_sales(session, sales)
+    record_usage(session, usage)
+    post_entry(session, sum(p.income - p.cost for p in priced.values()))
+    session.commit()
+
+    return BatchOrderResp(
+        accepted=len(accepted),
+        rejected=len(batch) - len(accepted) - duplicates,
+        duplicates=duplicates,
+        results=results,
+        low_stock=low_stock,
+    )
@@ -0,0 +1,144 @@
+# pricing.py
+#
+# Effective menu prices. A promotion charges discounted_price for each of its
+# items while start_time <= t < end_time. When promotions overlap, the lowest
+# price wins, and a promotion never charges more than the list price.
+#
+# Per menu item, the promotions are flattened into a schedule: sorted
+# segment start times, each with the lowest promotional price active in that
+# segment. A price lookup is one bisect, however many promotions the shop
+# has run. Each worker keeps its own index, holding only promotions that
+# have not ended (or ended within PROMOTION_INDEX_LOOKBACK_DAYS, since an
+# offline batch is priced at its client timestamp). The index is loaded on
+# startup and rebuilt by the promotion endpoints after each write and by a
+# background task every PROMOTION_INDEX_TTL seconds, which picks up writes
+# made by other workers. Orders only read the current index and never wait
+# for a rebuild.
+
+import asyncio
+import heapq
+import logging
+import os
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from database import engine
+from models import Promotion, PromotionItem
+
+PROMOTION_INDEX_TTL = float(os.getenv("PROMOTION_INDEX_TTL", "60"))
+PROMOTION_INDEX_LOOKBACK_DAYS = float(os.getenv("PROMOTION_INDEX_LOOKBACK_DAYS", "7"))
+
+log = logging.getLogger("coffee.pricing")
+
+
+class PriceSchedule(NamedTuple):
+    starts: Tuple[datetime, ...]            # ascending segment start times
+    prices: Tuple[Optional[float], ...]     # lowest promotional price from starts[k]; None = none
+
+
+def build_schedule(promotions: List[Tuple[datetime, datetime, float]]) -> PriceSchedule:
+    """Sweep (start, end, price) intervals into non-overlapping min-price segments."""
+    promotions = sorted(p for p in promotions if p[1] > p[0])
+    bounds = sorted({t for start, end, _ in promotions for t in (start, end)})
+    starts: List[datetime] = []
+    prices: List[Optional[float]] = []
+    active: List[Tuple[float, datetime]] = []  # heap of (price, end)
+    i = 0
+    for t in bounds:
+        while i < len(promotions) and promotions[i][0] <= t:
+            heapq.heappush(active, (promotions[i][2], promotions[i][1]))
+            i += 1
+        while active and active[0][1] <= t:
+            heapq.heappop(active)  # ended ones below the top are dropped when they surface
+        price = active[0][0] if active else None
+        if not prices or prices[-1] != price:
+            starts.append(t)
+            prices.append(price)
+    return PriceSchedule(tuple(starts), tuple(prices))
+
+
+class PromotionIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schedules: Dict[str, PriceSchedule] = {}
+        # bumped when a load starts, so a slower load that started earlier
+        # (and may have missed a write) does not replace a newer one
+        self._generation = 0
+        self._refresher: Optional[asyncio.Task] = None
+
+    def reload(self, session: Session):
+        """Rebuild the index from the database. Called after promotion writes."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        schedules = self._load(session, datetime.utcnow())
+        with self._lock:
+            if generation == self._generation:
+                self._schedules = schedules
+
+    @staticmethod
+    def _load(session: Session, now: datetime) -> Dict[str, PriceSchedule]:
+        rows = session.exec(
+            select(
+                PromotionItem.menu_item_name,
+                Promotion.start_time,
+                Promotion.end_time,
+                Promotion.discounted_price,
+            )
+            .join(Promotion, Promotion.promotion_id == PromotionItem.promotion_id)
+            .where(Promotion.end_time >= now - timedelta(days=PROMOTION_INDEX_LOOKBACK_DAYS))
+        ).all()
+        by_item: Dict[str, list] = defaultdict(list)
+        for name, start, end, price in rows:
+            by_item[name].append((start, end, price))
+        return {name: build_schedule(promotions) for name, promotions in by_item.items()}
+
+    def _reload_from_db(self):
+        with Session(engine) as session:
+            self.reload(session)
+
+    async def _refresh_forever(self):
+        while True:
+            await asyncio.sleep(PROMOTION_INDEX_TTL)
+            try:
+                await asyncio.to_thread(self._reload_from_db)
+            except Exception:
+                log.exception("promotion index reload failed; serving the previous index")
+
+    def start(self):
+        """Called on startup, outside any request, so reloads are not billed to one."""
+        if self._refresher is None:
+            self._reload_from_db()
+            self._refresher = asyncio.create_task(self._refresh_forever())
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    def price(self, name: str, at: datetime, list_price: float) -> float:
+        """What `name` costs at `at` (naive UTC)."""
+        schedule = self._schedules.get(name)
+        if schedule is None:
+            return list_price
+        k = bisect_right(schedule.starts, at) - 1
+        promo = schedule.prices[k] if k >= 0 else None
+        return list_price if promo is None else min(promo, list_price)
+
+    def clear(self):
+        """Forget every promotion (until the next reload), and any load in flight."""
+        with self._lock:
+            self._generation += 1
+            self._schedules = {}
+
+
+promotion_index = PromotionIndex()
@@ -0,0 +1,400 @@
+# query_budget.py
+#
+# SQL statement budgets per route. The costly regressions in this app have
+# all been N+1 patterns (a query per order line, per recipe ingredient, per
+# manager) that look harmless on a handful of rows. QueryBudgetMiddleware
+# counts the statements a request executes, through the cursor hooks in
+# database.py, until its response body is complete. It compares the count
+# with BUDGETS and reports statement shapes that repeat within one request.
+#
+# Exercise every endpoint against a throwaway SQLite database (or an empty
+# scratch Postgres database) and exit non-zero on any regression:
+#     python query_budget.py [--database-url URL] [--strict]
+#
+# In a running server, QUERY_BUDGET_CHECK=true logs violations instead.
+#
+# Budgets assume cold caches (principal, BOM and analytics), so they are
+# the worst case for one request. They must not depend on how many rows
+# or order lines are involved.
+
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from metrics import RequestStats, current_request
+
+QUERY_BUDGET_CHECK = os.getenv("QUERY_BUDGET_CHECK", "false").lower() in ("1", "true", "yes")
+# the same statement shape this many times in one request looks like N+1
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "3"))
+
+budget_log = logging.getLogger("coffee.query_budget")
+
+LISTED = (
+    "employees",
+    "managers",
+    "baristas",
+    "work_schedules",
+    "accounting_entries",
+    "inventory_items",
+    "menu_items",
+    "recipes",
+    "preparation_steps",
+    "recipe_ingredients",
+    "orders",
+    "order_line_items",
+    "promotions",
+    "promotion_items",
+)
+
+BUDGETS: Dict[Tuple[str, str], int] = {
+    # auth and operations
+    ("POST", "/signup"): 5,
+    ("POST", "/token"): 1,
+    ("GET", "/me"): 1,
+    ("GET", "/auth/hash_stats"): 1,
+    ("GET", "/db/pool_stats"): 1,
+    ("GET", "/metrics"): 0,
+    # listings and exports: principal + one page / one server-side cursor
+    **{("GET", f"/{name}{slash}"): 2 for name in LISTED for slash in ("", "/")},
+    ("GET", "/accounting_entries/balance"): 2,
+    ("GET", "/accounting_entries/history"): 2,
+    ("GET", "/exports/orders"): 2,
+    ("GET", "/exports/order_line_items"): 2,
+    ("GET", "/exports/accounting_entries"): 2,
+    # orders: principal, menu+BOM, stock, header, lines, two rollups, ledger
+    # head + entry + checkpoints (the promotion index is rebuilt off-request)
+    ("POST", "/orders"): 11,
+    ("POST", "/orders/"): 11,
+    # the same, plus the lookup of client_refs already applied
+    ("POST", "/orders/batch"): 12,
+    ("POST", "/inventory_items/{name}/refill"): 7,
+    # principal, usage history for the fit, stock
+    ("GET", "/inventory_items/forecast"): 3,
+    # CRUD
+    ("POST", "/employees"): 3,
+    ("POST", "/employees/"): 3,
+    ("PATCH", "/employees/{ssn}"): 4,
+    ("DELETE", "/employees/{ssn}"): 6,
+    ("POST", "/inventory_items"): 4,
+    ("POST", "/inventory_items/"): 4,
+    ("PATCH", "/inventory_items/{name}"): 4,
+    ("DELETE", "/inventory_items/{name}"): 4,
+    ("POST", "/menu_items/"): 4,
+    ("PATCH", "/menu_items/{name}"): 4,
+    ("DELETE", "/menu_items/{name}"): 6,
+    ("POST", "/recipes/"): 5,
+    ("POST", "/recipe_ingredients/"): 4,
+    # promotion writes end with one query to rebuild the promotion index
+    ("POST", "/promotions/"): 6,
+    ("PATCH", "/promotions/{promotion_id}"): 5,
+    ("DELETE", "/promotions/{promotion_id}"): 6,
+    ("POST", "/promotion_items/"): 7,
+    ("DELETE", "/promotion_items/{promotion_id}/{menu_item_name}"): 4,
+    # shifts: principal (events are written by the batched writer, off-request)
+    ("POST", "/shifts/clock_in"): 1,
+    ("POST", "/shifts/clock_out"): 1,
+    # principal + one windowed query
+    ("GET", "/shifts/payroll"): 2,
+    # analytics: principal + one rollup query
+    ("GET", "/analytics/revenue/"): 2,
+    ("GET", "/analytics/popular/"): 2,
+    ("GET", "/analytics/top-revenue/"): 2,
+    ("GET", "/analytics/cache/stats"): 1,
+    # principal, schedules (GET only), order timestamps (on a histogram miss)
+    ("GET", "/analytics/staffing/"): 3,
+    ("POST", "/analytics/staffing/"): 2,
+    # principal, wipe + insert-select per rollup
+    ("POST", "/analytics/rollup/rebuild"): 5,
+    # LLM
+    # principal, cache row; on a miss: merge (select + write), eviction cutoff + delete
+    ("GET", "/llm/description/{drink}"): 6,
+    # principal, BOMs, stock of their ingredients (the matrix refreshes in the background)
+    ("POST", "/llm/suggest/"): 3,
+}
+
+# Statements a dialect runs once per row by design; counted once per request.
+# SQLite cannot return bulk-inserted ids in parameter order, so SQLAlchemy
+# inserts batch order headers one at a time there (Postgres batches them).
+ROW_AT_A_TIME = {
+    "sqlite": ('INSERT INTO "order" ',),
+}
+
+_PLACEHOLDER = re.compile(r"\?|%\(\w+\)s|%s|\$\d+")
+_VALUE_LIST = re.compile(r"\(\?(?:, \?)*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL with placeholders unified and expanded IN/VALUES lists collapsed."""
+    shape = _PLACEHOLDER.sub("?", " ".join(statement.split()))
+    return _VALUE_LIST.sub("(?)", shape)
+
+
+class Report(NamedTuple):
+    method: str
+    route: str
+    status: int
+    statements: int
+    budget: Optional[int]
+    repeated: List[Tuple[str, int]]
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.statements > self.budget
+
+    def describe(self) -> str:
+        budget = "no budget" if self.budget is None else f"budget {self.budget}"
+        lines = [f"{self.method} {self.route} -> {self.status}: {self.statements} statements ({budget})"]
+        lines += [f"    repeated x{n}: {shape[:160]}" for shape, n in self.repeated]
+        return "\n".join(lines)
+
+
+def check(method: str, route: str, status: int, stats: RequestStats) -> Report:
+    from database import engine
+
+    exempt = ROW_AT_A_TIME.get(engine.dialect.name, ())
+    statements = stats.statements
+    shapes = Counter()
+    for statement, n in (stats.shapes or {}).items():
+        shapes[statement_shape(statement)] += n
+    for shape, n in list(shapes.items()):
+        if shape.startswith(exempt):
+            statements -= n - 1
+            del shapes[shape]
+    repeated = [(shape, n) for shape, n in shapes.most_common() if n >= QUERY_REPEAT_LIMIT]
+    return Report(method, route, status, statements, BUDGETS.get((method, route)), repeated)
+
+
+def log_report(report: Report):
+    if report.over_budget or report.repeated:
+        budget_log.warning("query budget: %s", report.describe())
+
+
+class QueryBudgetMiddleware:
+    """Pure ASGI, so statements issued while a streamed body is sent still count."""
+
+    def __init__(self, app, on_report: Callable[[Report], None] = log_report):
+        self.app = app
+        self.on_report = on_report
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        stats.shapes = Counter()
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                self.on_report(check(scope["method"], route.path, status_code, stats))
+
+
+# ── harness ──
+
+def run_harness(strict: bool) -> int:
+    from fastapi.routing import APIRoute
+    from fastapi.testclient import TestClient
+
+    import httpx
+
+    import analytics
+    import forecast
+    import llm
+    import llm_stub
+    import main
+    import recommender
+    import staffing
+    from auth import principal_cache
+    from bom_cache import bom_cache
+    from pricing import promotion_index
+
+    llm.use_transport(httpx.ASGITransport(app=llm_stub.app))
+    reports: List[Report] = []
+    failures: List[str] = []
+
+    # wrapped rather than added with add_middleware, so the harness can run
+    # more than once in a process (e.g. under pytest)
+    with TestClient(QueryBudgetMiddleware(main.app, on_report=reports.append)) as client:
+        headers = {}
+
+        def call(method: str, path: str, **kwargs):
+            principal_cache.clear()
+            bom_cache.clear()
+            analytics.invalidate_all()
+            forecast.fits.clear()
+            promotion_index.clear()
+            staffing.histograms.clear()
+            r = client.request(method, path, headers=headers, **kwargs)
+            if r.status_code >= 400:
+                failures.append(f"{method} {path}: unexpected {r.status_code} {r.text[:200]}")
+            return r
+
+        signup = {"name": "Ann", "email": "ann@example.com", "salary": 20.0, "password": "pw"}
+        token = call("POST", "/signup", json={"ssn": "100", **signup}).json()["access_token"]
+        headers["Authorization"] = f"Bearer {token}"
+        call("POST", "/signup", json={**signup, "ssn": "101", "email": "bob@example.com"})
+        call("POST", "/signup", json={**signup, "ssn": "102", "email": "cy@example.com"})
+        call("POST", "/token", data={"username": "ann@example.com", "password": "pw"})
+        call("GET", "/me")
+        for ssn in ("200", "201"):
+            call("POST", "/employees", json={**signup, "ssn": ssn, "email": f"{ssn}@example.com"})
+        call("POST", "/employees/", json={**signup, "ssn": "202", "email": "202@example.com"})
+        call("PATCH", "/employees/200", json={"name": "Ann B", "password": "pw2"})
+        call("DELETE", "/employees/202")
+
+        for name in ("beans", "milk", "sugar", "cocoa"):
+            call("POST", "/inventory_items/", json={
+                "name": name, "unit": "oz", "price_per_unit": 0.5, "amount_in_stock": 500,
+            })
+        call("POST", "/inventory_items", json={
+            "name": "spare", "unit": "oz", "price_per_unit": 1, "amount_in_stock": 1,
+        })
+        call("PATCH", "/inventory_items/spare", json={
+            "name": "spare", "unit": "oz", "price_per_unit": 2, "amount_in_stock": 1,
+        })
+        call("DELETE", "/inventory_items/spare")
+        call("POST", "/inventory_items/beans/refill", json={"quantity": 50})
+
+        menu = {"size_ounces": 12, "type": "coffee", "price": 4.0, "is_hot": True}
+        for name in ("latte", "mocha", "flat white", "special"):
+            call("POST", "/menu_items/", json={"name": name, **menu})
+        call("PATCH", "/menu_items/special", json={"name": "special", **menu, "price": 5.0})
+        call("DELETE", "/menu_items/special")
+        bom = {
+            "latte": ("beans", "milk"),
+            "mocha": ("beans", "milk", "sugar", "cocoa"),
+            "flat white": ("beans", "milk", "sugar"),
+        }
+        for item, ingredients in bom.items():
+            recipe_id = call("POST", "/recipes/", json={"menu_item_name": item}).json()["recipe_id"]
+            for ingredient in ingredients:
+                call("POST", "/recipe_ingredients/", json={
+                    "recipe_id": recipe_id, "inventory_item_name": ingredient,
+                    "quantity": 1, "unit": "oz",
+                })
+
+        now = datetime.utcnow()
+        window = {"start_time": (now - timedelta(hours=1)).isoformat(),
+                  "end_time": (now + timedelta(hours=1)).isoformat()}
+        promo = call("POST", "/promotions/", json={
+            **window, "discounted_price": 3.0, "menu_item_names": ["latte", "mocha"],
+        }).json()["promotion_id"]
+        call("PATCH", f"/promotions/{promo}", json={**window, "discounted_price": 2.5})
+        call("POST", "/promotion_items/", json={"promotion_id": promo, "menu_item_name": "flat white"})
+        call("DELETE", f"/promotion_items/{promo}/flat white")
+        spare = call("POST", "/promotions/", json={**window, "discounted_price": 1.0}).json()
+        call("DELETE", f"/promotions/{spare['promotion_id']}")
+
+        lines = [{"menu_item_name": name, "quantity": 2} for name in bom]
+        call("POST", "/orders/", json={"payment_method": "cash", "items": lines})
+        call("POST", "/orders", json={"payment_method": "card", "items": lines[:1]})
+        call("POST", "/orders/batch", json=[
+            {"payment_method": "cash", "items": lines, "client_ref": str(i),
+             "client_timestamp": now.isoformat()}
+            for i in range(5)
+        ])
+        # orders without a latte, so latte pairs get a lift above 1; then fold
+        # them in (off-request, as the background task does) so the
+        # suggestion runs its scoring and stock queries
+        for _ in range(4):
+            call("POST", "/orders/", json={"payment_method": "cash", "items": lines[2:]})
+        recommender.co_occurrence.refresh(full=True)
+        suggested = call("POST", "/llm/suggest/", json={"payment_method": "cash", "items": lines[:1]})
+        if not suggested.json().get("suggestions"):
+            failures.append("POST /llm/suggest/: no suggestions, so its queries were not exercised")
+        call("GET", "/llm/description/latte")  # generated and stored
+        call("GET", "/llm/description/latte")  # served from drink_description
+        call("GET", "/llm/description/latte", params={"refresh": "true"})
+
+        for route in main.app.routes:
+            if (isinstance(route, APIRoute) and "GET" in route.methods and "{" not in route.path
+                    and route.path not in ("/me", "/accounting_entries/balance", "/accounting_entries/history")
+                    and not route.path.startswith(("/analytics", "/exports", "/shifts"))):
+                call("GET", route.path)
+        call("GET", "/orders?limit=2")
+        call("GET", "/accounting_entries/balance")
+        call("GET", "/accounting_entries/balance", params={"at": "2099-01-01T00:00:00"})
+        call("GET", "/accounting_entries/history", params={"start": "2000-01-01T00:00:00"})
+        call("GET", "/accounting_entries/history", params={"start": (now - timedelta(days=1)).isoformat()})
+        for export in ("orders", "order_line_items", "accounting_entries"):
+            call("GET", f"/exports/{export}")
+            call("GET", f"/exports/{export}", params={"format": "csv"})
+
+        call("POST", "/shifts/clock_in")
+        call("POST", "/shifts/clock_out")
+        call("POST", "/shifts/clock_in")
+        call("GET", "/shifts/payroll", params={"start": now.date().isoformat(), "end": now.date().isoformat()})
+
+        today = now.date().isoformat()
+        year, month = now.year, now.month
+        call("GET", "/analytics/revenue/", params={"start": today, "end": today})
+        call("GET", "/analytics/popular/", params={"year": year, "month": month})
+        call("GET", "/analytics/top-revenue/", params={"start": today, "end": today})
+        call("GET", "/analytics/cache/stats")
+        call("GET", "/analytics/staffing/")
+        call("POST", "/analytics/staffing/", json=[
+            {"day_of_week": "1", "start_time": "07:00:00", "end_time": "15:00:00"},
+            {"day_of_week": "7", "start_time": "22:00:00", "end_time": "02:00:00"},
+        ])
+        call("POST", "/analytics/rollup/rebuild", json={"start": today, "end": today})
+
+    worst: Dict[Tuple[str, str], Report] = {}
+    for report in reports:
+        key = (report.method, report.route)
+        if key not in worst or report.statements > worst[key].statements:
+            worst[key] = report
+        if report.over_budget:
+            failures.append("over budget: " + report.describe())
+        elif report.repeated and strict:
+            failures.append("repeated statements: " + report.describe())
+        elif report.repeated:
+            print("warning: repeated statements: " + report.describe())
+
+    declared = {
+        (method, route.path)
+        for route in main.app.routes if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    for key in sorted(declared - set(BUDGETS)):
+        failures.append(f"no budget declared for {key[0]} {key[1]}")
+    for key in sorted(declared - set(worst)):
+        failures.append(f"not exercised by the harness: {key[0]} {key[1]}")
+    for key in sorted(set(BUDGETS) - declared):
+        failures.append(f"budget for a route that no longer exists: {key[0]} {key[1]}")
+
+    for key in sorted(worst):
+        r = worst[key]
+        print(f"{r.statements:>4} / {BUDGETS.get(key, '-'):>4}  {key[0]:<6} {key[1]}")
+    for failure in failures:
+        print("FAIL " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Check SQL statement budgets for every route")
+    parser.add_argument("--database-url", help="empty scratch database (default: temporary SQLite)")
+    parser.add_argument("--strict", action="store_true", help="also fail on repeated statements")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/budget.db"
+    os.environ.setdefault("SECRET_KEY", "query-budget")
+    os.environ["SQL_SLOW_MS"] = "1e9"
+    sys.exit(run_harness(args.strict))
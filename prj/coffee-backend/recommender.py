@@ -0,0 +1,217 @@
+# recommender.py
+#
+# Suggestions behind POST /llm/suggest/: "customers who ordered this also
+# ordered". An item-to-item co-occurrence matrix over order history is kept
+# in memory. A background task started with the app folds in OrderLineItem
+# rows past the last order id seen every RECOMMENDER_REFRESH_SECONDS, and
+# rebuilds from scratch every RECOMMENDER_REBUILD_SECONDS. The rebuild also
+# picks up orders that committed behind the watermark. Requests only read
+# the current matrix and never wait for a refresh.
+#
+# A cart is scored against a precomputed lift matrix with one NumPy
+# reduction. The top candidates are then kept only if every ingredient in
+# their recipe is in stock.
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from bom_cache import bom_cache
+from database import engine
+from models import InventoryItem, OrderLineItem
+
+RECOMMENDER_REFRESH_SECONDS = float(os.getenv("RECOMMENDER_REFRESH_SECONDS", "30"))
+RECOMMENDER_REBUILD_SECONDS = float(os.getenv("RECOMMENDER_REBUILD_SECONDS", "3600"))
+# pairs seen together in fewer orders than this are treated as noise
+RECOMMENDER_MIN_SUPPORT = int(os.getenv("RECOMMENDER_MIN_SUPPORT", "3"))
+
+SUGGESTIONS = 3
+# orders folded per matrix product, to bound memory on a full rebuild
+FOLD_CHUNK = 50_000
+
+log = logging.getLogger("coffee.recommender")
+
+
+class Matrix(NamedTuple):
+    """
+    counts[i, j] = orders containing both items i and j (diagonal: orders
+    containing i); lift[i, j] = P(i and j) / (P(i) P(j)), zeroed where the
+    pair is rare or not positively associated.
+    """
+    names: List[str]
+    index: Dict[str, int]
+    counts: np.ndarray
+    lift: np.ndarray
+    orders: int
+    last_order_id: int
+
+
+EMPTY = Matrix([], {}, np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0)), 0, 0)
+
+
+class CoOccurrence:
+    """
+    The current Matrix. A refresh builds a new one in a worker thread and
+    publishes it with one assignment; readers take `matrix` once and use
+    only that, so they never see parts of two different refreshes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()      # serialises refreshes
+        self.matrix = EMPTY
+        self.refreshed_at = 0.0
+        self.rebuilt_at = 0.0
+
+    def refresh(self, full: bool = False) -> int:
+        """Fold in orders placed since the last refresh; returns how many."""
+        if not self._lock.acquire(blocking=False):
+            return 0  # a refresh is already running
+        try:
+            now = time.monotonic()
+            full = full or now - self.rebuilt_at >= RECOMMENDER_REBUILD_SECONDS
+            current = self.matrix
+            since = 0 if full else current.last_order_id
+            with Session(engine) as session:
+                rows = session.exec(
+                    select(OrderLineItem.order_id, OrderLineItem.menu_item_name)
+                    .where(OrderLineItem.order_id > since)
+                    .order_by(OrderLineItem.order_id)
+                ).all()
+
+            if full:
+                names, index = [], {}
+                counts, orders, last_order_id = np.zeros((0, 0), dtype=np.int64), 0, 0
+            else:
+                names, index = list(current.names), dict(current.index)
+                counts, orders, last_order_id = current.counts, current.orders, current.last_order_id
+
+            folded = 0
+            if rows:
+                order_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+                for name in {r[1] for r in rows}:
+                    if name not in index:
+                        index[name] = len(names)
+                        names.append(name)
+                items = np.fromiter((index[r[1]] for r in rows), dtype=np.int64, count=len(rows))
+                if len(names) > counts.shape[0]:
+                    grow = len(names) - counts.shape[0]
+                    counts = np.pad(counts, ((0, grow), (0, grow)))
+                _, order_rows = np.unique(order_ids, return_inverse=True)
+                folded = int(order_rows.max()) + 1
+                counts = counts + self._fold(order_rows, items, folded, len(names))
+                orders += folded
+                last_order_id = int(order_ids[-1])
+
+            lift = self._lift(counts, orders) if folded or full else current.lift
+            self.matrix = Matrix(names, index, counts, lift, orders, last_order_id)
+            self.refreshed_at = now
+            if full:
+                self.rebuilt_at = now
+            return folded
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _fold(order_rows: np.ndarray, items: np.ndarray, n_orders: int, n_items: int) -> np.ndarray:
+        """X^T X over the order/item incidence matrix, FOLD_CHUNK orders at a time."""
+        total = np.zeros((n_items, n_items), dtype=np.int64)
+        for start in range(0, n_orders, FOLD_CHUNK):
+            mask = (order_rows >= start) & (order_rows < start + FOLD_CHUNK)
+            x = np.zeros((min(FOLD_CHUNK, n_orders - start), n_items), dtype=np.int64)
+            x[order_rows[mask] - start, items[mask]] = 1
+            total += x.T @ x
+        return total
+
+    @staticmethod
+    def _lift(counts: np.ndarray, orders: int) -> np.ndarray:
+        support = np.diag(counts).astype(float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lift = counts * float(orders) / np.outer(support, support)
+        lift[~np.isfinite(lift) | (counts < RECOMMENDER_MIN_SUPPORT) | (lift <= 1.0)] = 0.0
+        np.fill_diagonal(lift, 0.0)
+        return lift
+
+    def score(self, cart: Iterable[str]) -> List[Tuple[str, str]]:
+        """(candidate, cart item it pairs with best), best first."""
+        m = self.matrix
+        rows = sorted({m.index[n] for n in cart if n in m.index})
+        if not rows:
+            return []
+        by_cart_item = m.lift[rows]
+        scores = by_cart_item.sum(axis=0)
+        scores[rows] = 0.0
+        anchors = by_cart_item.argmax(axis=0)
+        ranked = np.argsort(-scores, kind="stable")
+        return [(m.names[i], m.names[rows[anchors[i]]]) for i in ranked if scores[i] > 0]
+
+    def popular(self, exclude: Set[str]) -> List[str]:
+        m = self.matrix
+        ranked = np.argsort(-np.diag(m.counts), kind="stable")
+        return [m.names[i] for i in ranked if m.names[i] not in exclude]
+
+
+def available(session: Session, names: Sequence[str]) -> Set[str]:
+    """Menu items that have a recipe and enough of every ingredient for one."""
+    boms = bom_cache.get_many(session, names)
+    needed = {line.inventory_item_name for bom in boms.values() if bom for line in bom}
+    stock = dict(session.exec(
+        select(InventoryItem.name, InventoryItem.amount_in_stock)
+        .where(InventoryItem.name.in_(needed))
+    ).all()) if needed else {}
+    return {
+        name for name, bom in boms.items()
+        if bom and all(stock.get(line.inventory_item_name, 0) >= line.quantity for line in bom)
+    }
+
+
+co_occurrence = CoOccurrence()
+_refresher: Optional[asyncio.Task] = None
+
+
+async def _refresh_forever():
+    while True:
+        try:
+            await asyncio.to_thread(co_occurrence.refresh)
+        except Exception:
+            log.exception("co-occurrence refresh failed; serving the previous matrix")
+        await asyncio.sleep(RECOMMENDER_REFRESH_SECONDS)
+
+
+def start():
+    """Called on startup, outside any request, so refreshes are not billed to one."""
+    global _refresher
+    if _refresher is None:
+        _refresher = asyncio.create_task(_refresh_forever())
+
+
+async def close():
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except asyncio.CancelledError:
+            pass
+        _refresher = None
+
+
+async def suggest(session: AsyncSession, cart: Sequence[str], k: int = SUGGESTIONS) -> List[str]:
+    in_cart = set(cart)
+    paired = co_occurrence.score(in_cart)[: k * 3]
+    seen = in_cart | {name for name, _ in paired}
+    fallback = co_occurrence.popular(seen)[: k * 3]
+    candidates = [name for name, _ in paired] + fallback
+    if not candidates:
+        return []
+    ok = await session.run_sync(available, candidates)
+
+    out = [f"{name} – often ordered with {anchor}" for name, anchor in paired if name in ok][:k]
+    out += [f"{name} – a customer favourite" for name in fallback if name in ok][: k - len(out)]
+    return out
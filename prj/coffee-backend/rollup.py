@@ -0,0 +1,188 @@
+# rollup.py
+#
+# daily_item_sales holds quantity, revenue and ingredient cost per day and
+# menu item; hourly_ingredient_usage holds ingredient consumed per hour. The
+# order path adds to both in the same transaction as the order, so the
+# analytics and forecast endpoints never have to scan line items.
+#
+# Rebuild (or backfill) them with:
+#     python rollup.py [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+
+import argparse
+from datetime import date, datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, func, select
+
+from analytics import day_bounds
+from database import upsert
+from models import (
+    DailyItemSales,
+    HourlyIngredientUsage,
+    Order,
+    OrderLineItem,
+    Recipe,
+    RecipeIngredient,
+)
+
+
+class ItemSales(NamedTuple):
+    quantity: int
+    revenue: float
+    ingredient_cost: float
+
+
+def hour_of(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def record_sales(session: Session, sales: Dict[Tuple[date, str], ItemSales]):
+    """Add to the rollup rows for each (day, menu item). Nothing is committed here."""
+    if not sales:
+        return
+    stmt = upsert(session, DailyItemSales).values(
+        [
+            {
+                "sales_date": day,
+                "menu_item_name": name,
+                "quantity": s.quantity,
+                "revenue": s.revenue,
+                "ingredient_cost": s.ingredient_cost,
+            }
+            for (day, name), s in sales.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyItemSales.sales_date, DailyItemSales.menu_item_name],
+        set_={
+            "quantity": DailyItemSales.quantity + stmt.excluded.quantity,
+            "revenue": DailyItemSales.revenue + stmt.excluded.revenue,
+            "ingredient_cost": DailyItemSales.ingredient_cost + stmt.excluded.ingredient_cost,
+        },
+    )
+    session.exec(stmt)
+
+
+def record_usage(session: Session, usage: Dict[Tuple[datetime, str], float]):
+    """Add to the usage rows for each (hour, inventory item). Nothing is committed here."""
+    if not usage:
+        return
+    stmt = upsert(session, HourlyIngredientUsage).values(
+        [
+            {"hour": hour, "inventory_item_name": name, "quantity": qty}
+            for (hour, name), qty in usage.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[HourlyIngredientUsage.hour, HourlyIngredientUsage.inventory_item_name],
+        set_={"quantity": HourlyIngredientUsage.quantity + stmt.excluded.quantity},
+    )
+    session.exec(stmt)
+
+
+def rebuild_source(start: Optional[date] = None, end: Optional[date] = None):
+    """
+    SELECT of rollup rows from orders in [start, end], at the prices and
+    ingredient costs stored on each line when it was ordered.
+    """
+    day = func.date(Order.timestamp)
+    source = (
+        select(
+            day,
+            OrderLineItem.menu_item_name,
+            func.sum(OrderLineItem.quantity),
+            func.sum(OrderLineItem.quantity * OrderLineItem.unit_price),
+            func.sum(OrderLineItem.quantity * OrderLineItem.unit_cost),
+        )
+        .join(Order, Order.order_id == OrderLineItem.order_id)
+        .group_by(day, OrderLineItem.menu_item_name)
+    )
+    # filter on the raw timestamp so the index on order.timestamp applies
+    if start:
+        source = source.where(Order.timestamp >= day_bounds(start, start)[0])
+    if end:
+        source = source.where(Order.timestamp < day_bounds(end, end)[1])
+    return source
+
+
+def rebuild_daily_item_sales(
+    session: Session, start: Optional[date] = None, end: Optional[date] = None
+) -> int:
+    """
+    Recompute the rollup from orders for [start, end] (both inclusive, open
+    when omitted) and commit.
+    """
+    wipe = delete(DailyItemSales)
+    if start:
+        wipe = wipe.where(DailyItemSales.sales_date >= start)
+    if end:
+        wipe = wipe.where(DailyItemSales.sales_date <= end)
+    session.exec(wipe)
+    result = session.exec(
+        insert(DailyItemSales).from_select(
+            ["sales_date", "menu_item_name", "quantity", "revenue", "ingredient_cost"],
+            rebuild_source(start, end),
+        )
+    )
+    session.commit()
+    return result.rowcount
+
+
+def usage_source(session: Session, start: Optional[date] = None, end: Optional[date] = None):
+    """SELECT of hourly usage rows from orders in [start, end]; uses current recipes."""
+    if session.get_bind().dialect.name == "sqlite":
+        # same text form SQLAlchemy writes for DateTime, so keys compare equal
+        hour = func.strftime("%Y-%m-%d %H:00:00.000000", Order.timestamp)
+    else:
+        hour = func.date_trunc("hour", Order.timestamp)
+    source = (
+        select(
+            hour,
+            RecipeIngredient.inventory_item_name,
+            func.sum(OrderLineItem.quantity * RecipeIngredient.quantity),
+        )
+        .join(Order, Order.order_id == OrderLineItem.order_id)
+        .join(Recipe, Recipe.menu_item_name == OrderLineItem.menu_item_name)
+        .join(RecipeIngredient, RecipeIngredient.recipe_id == Recipe.recipe_id)
+        .group_by(hour, RecipeIngredient.inventory_item_name)
+    )
+    if start:
+        source = source.where(Order.timestamp >= day_bounds(start, start)[0])
+    if end:
+        source = source.where(Order.timestamp < day_bounds(end, end)[1])
+    return source
+
+
+def rebuild_hourly_usage(
+    session: Session, start: Optional[date] = None, end: Optional[date] = None
+) -> int:
+    """Recompute hourly_ingredient_usage for [start, end] like rebuild_daily_item_sales."""
+    wipe = delete(HourlyIngredientUsage)
+    if start:
+        wipe = wipe.where(HourlyIngredientUsage.hour >= day_bounds(start, start)[0])
+    if end:
+        wipe = wipe.where(HourlyIngredientUsage.hour < day_bounds(end, end)[1])
+    session.exec(wipe)
+    result = session.exec(
+        insert(HourlyIngredientUsage).from_select(
+            ["hour", "inventory_item_name", "quantity"],
+            usage_source(session, start, end),
+        )
+    )
+    session.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Rebuild the sales and ingredient usage rollups")
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    args = parser.parse_args()
+    with Session(engine) as session:
+        rows = rebuild_daily_item_sales(session, args.start, args.end)
+        usage_rows = rebuild_hourly_usage(session, args.start, args.end)
+    print(f"daily_item_sales: {rows} rows rebuilt")
+    print(f"hourly_ingredient_usage: {usage_rows} rows rebuilt")
@@ -0,0 +1,175 @@
+# shiftlog.py
+#
+# Shift events (clock in / clock out / order placed) and payroll.
+#
+# Events are buffered in memory and written by one background task, one
+# multi-row INSERT per batch. A batch is flushed every SHIFT_LOG_FLUSH_SECONDS,
+# or sooner once SHIFT_LOG_BATCH events are waiting. Clock-in/out requests
+# wait for their batch to commit. Order events are not waited on, so the
+# order path pays no extra round trip. The price is that if the process
+# dies, order events from the last flush interval are lost (the orders
+# themselves are not).
+#
+# Payroll pairs each clock_in with the employee's next clock event
+# (LEAD over the (ssn, timestamp) index), then clips and sums the shifts
+# with NumPy. Employee.salary is taken as an hourly rate.
+
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import Session, func, select
+
+from analytics import day_bounds
+from database import async_engine
+from models import Employee, EventType, PayrollLine, ShiftLog
+
+SHIFT_LOG_FLUSH_SECONDS = float(os.getenv("SHIFT_LOG_FLUSH_SECONDS", "0.2"))
+SHIFT_LOG_BATCH = int(os.getenv("SHIFT_LOG_BATCH", "500"))
+# a clock_in with no clock_out within this many hours is reported, not paid
+PAYROLL_MAX_SHIFT_HOURS = float(os.getenv("PAYROLL_MAX_SHIFT_HOURS", "16"))
+
+log = logging.getLogger("coffee.shiftlog")
+
+
+class ShiftLogWriter:
+    def __init__(self):
+        self._pending: List[Tuple[dict, Optional[asyncio.Future]]] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Called on startup, outside any request, so the writer's SQL is not billed to one."""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def record(self, ssn: str, event_type: EventType, at: Optional[datetime] = None) -> asyncio.Future:
+        """Queue an event; the returned future resolves once it is committed."""
+        done = asyncio.get_running_loop().create_future()
+        self._pending.append(
+            ({"ssn": ssn, "event_type": event_type, "timestamp": at or datetime.utcnow()}, done)
+        )
+        if len(self._pending) >= SHIFT_LOG_BATCH and self._wake is not None:
+            self._wake.set()
+        return done
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), SHIFT_LOG_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._pending:
+            batch, self._pending = self._pending[:SHIFT_LOG_BATCH], self._pending[SHIFT_LOG_BATCH:]
+            try:
+                async with async_engine.begin() as conn:
+                    await conn.execute(insert(ShiftLog), [row for row, _ in batch])
+            except Exception as exc:
+                log.exception("dropped %d shift log events", len(batch))
+                for _, done in batch:
+                    if not done.done():
+                        done.set_exception(exc)
+                        done.exception()  # nobody waits on order events
+                continue
+            for _, done in batch:
+                if not done.done():
+                    done.set_result(None)
+
+    async def close(self):
+        """Called on shutdown: stop the loop and write whatever is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+shift_log = ShiftLogWriter()
+
+
+def payroll(session: Session, start: date, end: date) -> List[PayrollLine]:
+    """Hours worked and their cost per employee for [start, end] (UTC days)."""
+    lo, hi = day_bounds(start, end)
+    slack = timedelta(hours=PAYROLL_MAX_SHIFT_HOURS)
+    following = dict(partition_by=ShiftLog.ssn, order_by=(ShiftLog.timestamp, ShiftLog.id))
+    events = (
+        select(
+            ShiftLog.ssn,
+            ShiftLog.event_type,
+            ShiftLog.timestamp,
+            func.lead(ShiftLog.event_type).over(**following).label("next_type"),
+            func.lead(ShiftLog.timestamp).over(**following).label("next_timestamp"),
+        )
+        .where(
+            ShiftLog.event_type.in_([EventType.clock_in, EventType.clock_out]),
+            ShiftLog.timestamp >= lo - slack,
+            ShiftLog.timestamp < hi + slack,
+        )
+        .subquery()
+    )
+    rows = session.exec(
+        select(
+            Employee.ssn,
+            Employee.name,
+            Employee.salary,
+            events.c.timestamp,
+            events.c.next_type,
+            events.c.next_timestamp,
+        )
+        .outerjoin(events, (events.c.ssn == Employee.ssn) & (events.c.event_type == EventType.clock_in)
+                   & (events.c.timestamp >= lo - slack) & (events.c.timestamp < hi))
+        .order_by(Employee.ssn)
+    ).all()
+
+    staff = {}
+    for ssn, name, salary, *_ in rows:
+        staff.setdefault(ssn, (name, salary))
+    index = {ssn: i for i, ssn in enumerate(staff)}
+    shifts = [r for r in rows if r[3] is not None]
+    who = np.fromiter((index[r[0]] for r in shifts), dtype=np.int64, count=len(shifts))
+    period_start, period_end = np.datetime64(lo, "us"), np.datetime64(hi, "us")
+    hour = np.timedelta64(3600, "s")
+    clock_in = np.array([r[3] for r in shifts], dtype="datetime64[us]")
+    has_out = np.array([r[4] == EventType.clock_out for r in shifts], dtype=bool)
+    clock_out = np.where(has_out, np.array([r[5] or r[3] for r in shifts], dtype="datetime64[us]"), clock_in)
+    paired = has_out & ((clock_out - clock_in) / hour <= PAYROLL_MAX_SHIFT_HOURS)
+    # still clocked in: neither paid nor unpaired yet
+    still_open = np.array([r[4] is None for r in shifts], dtype=bool) & (
+        clock_in > np.datetime64(datetime.utcnow() - slack, "us")
+    )
+    # only the part of each shift inside the period counts
+    inside = (np.minimum(clock_out, period_end) - np.maximum(clock_in, period_start)) / hour
+    starts_before = clock_in < period_start
+    paid = paired & (clock_in < period_end) & ((inside > 0) | ~starts_before)
+    hours = np.bincount(who[paid], weights=inside[paid], minlength=len(staff))
+    counted = np.bincount(who[paid], minlength=len(staff))
+    # an unpaired clock_in is reported in the period it started in
+    unpaired = np.bincount(
+        who[~paired & ~still_open & ~starts_before], minlength=len(staff)
+    )
+
+    return [
+        PayrollLine(
+            ssn=ssn,
+            name=name,
+            hours=round(float(hours[i]), 4),
+            hourly_rate=salary,
+            cost=round(float(hours[i]) * salary, 2),
+            shifts=int(counted[i]),
+            unpaired_clock_ins=int(unpaired[i]),
+        )
+        for i, (ssn, (name, salary)) in enumerate(staff.items())
+    ]
+
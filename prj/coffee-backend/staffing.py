@@ -0,0 +1,140 @@
+# staffing.py
+#
+# Staffing coverage behind /analytics/staffing/: baristas on duty versus
+# order volume per 15-minute bucket of the week (Monday 00:00 first).
+#
+# Shifts are swept with a difference array at minute resolution. A
+# barista on for 10 of a bucket's 15 minutes counts as 2/3 of a barista
+# there. Orders from the last STAFFING_HISTORY_WEEKS whole weeks are
+# bucketed the same way and averaged per week. That histogram is the only
+# expensive part, so it is cached for STAFFING_CACHE_TTL seconds. The
+# sweep itself is a few NumPy operations, cheap enough to rerun on every
+# edit of the schedule page (POST takes draft shifts and stores nothing).
+
+import math
+import os
+from datetime import datetime, time, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from cache import MISSING, TTLCache
+from models import Order, StaffingReport, StaffingSlot, WorkSchedule
+
+STAFFING_HISTORY_WEEKS = int(os.getenv("STAFFING_HISTORY_WEEKS", "4"))
+# orders one barista can handle in a bucket
+STAFFING_ORDERS_PER_BARISTA = float(os.getenv("STAFFING_ORDERS_PER_BARISTA", "8"))
+# schedules are in shop time; orders are stored in UTC
+STAFFING_UTC_OFFSET_MINUTES = int(os.getenv("STAFFING_UTC_OFFSET_MINUTES", "0"))
+STAFFING_CACHE_TTL = float(os.getenv("STAFFING_CACHE_TTL", "300"))
+
+BUCKET_MINUTES = 15
+WEEK_MINUTES = 7 * 24 * 60
+BUCKETS = WEEK_MINUTES // BUCKET_MINUTES
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+histograms = TTLCache(8, ttl=STAFFING_CACHE_TTL)
+
+
+def day_index(day_of_week) -> int:
+    """0 = Monday. Accepts 1-7 (as stored by the schedule page) or day names."""
+    value = str(day_of_week).strip().lower()
+    if value.isdigit() and 1 <= int(value) <= 7:
+        return int(value) - 1
+    if value[:3] in DAY_NAMES:
+        return DAY_NAMES.index(value[:3])
+    raise HTTPException(status_code=422, detail=f"Unknown day_of_week {day_of_week!r}")
+
+
+def _minute(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def staff_on_duty(shifts: Iterable[Tuple[object, time, time]]) -> np.ndarray:
+    """Average baristas on duty per bucket. A shift ending at or before its start runs past midnight."""
+    starts, ends = [], []
+    for day, start, end in shifts:
+        first = day_index(day) * 24 * 60 + _minute(start)
+        length = (_minute(end) - _minute(start)) % (24 * 60) or 24 * 60
+        starts.append(first)
+        ends.append(first + length)
+    diff = np.zeros(WEEK_MINUTES + 1)
+    if starts:
+        starts, ends = np.array(starts), np.array(ends)
+        wraps = ends > WEEK_MINUTES  # Sunday night into Monday morning
+        np.add.at(diff, starts, 1)
+        np.add.at(diff, np.minimum(ends, WEEK_MINUTES), -1)
+        np.add.at(diff, np.zeros(wraps.sum(), dtype=np.int64), 1)
+        np.add.at(diff, ends[wraps] - WEEK_MINUTES, -1)
+    on_duty = np.cumsum(diff[:-1])
+    return on_duty.reshape(BUCKETS, BUCKET_MINUTES).mean(axis=1)
+
+
+def order_histogram(session: Session, now: datetime) -> np.ndarray:
+    """Average orders per bucket over the last STAFFING_HISTORY_WEEKS whole weeks."""
+    offset = timedelta(minutes=STAFFING_UTC_OFFSET_MINUTES)
+    # whole weeks ending at the last shop midnight, so every bucket occurs equally often
+    end = datetime.combine((now + offset).date(), time.min) - offset
+    key = (end, STAFFING_HISTORY_WEEKS, STAFFING_UTC_OFFSET_MINUTES)
+    counts = histograms.get(key)
+    if counts is not MISSING:
+        return counts
+    generation = histograms.generation
+    start = end - timedelta(weeks=STAFFING_HISTORY_WEEKS)
+    stamps = session.exec(
+        select(Order.timestamp).where(Order.timestamp >= start, Order.timestamp < end)
+    ).all()
+    local = np.array(stamps, dtype="datetime64[m]") + np.timedelta64(STAFFING_UTC_OFFSET_MINUTES, "m")
+    minutes = local.astype(np.int64)
+    # 1970-01-01 was a Thursday (weekday 3)
+    minute_of_week = (minutes // (24 * 60) + 3) % 7 * 24 * 60 + minutes % (24 * 60)
+    counts = np.bincount(minute_of_week // BUCKET_MINUTES, minlength=BUCKETS) / STAFFING_HISTORY_WEEKS
+    histograms.set(key, counts, generation)
+    return counts
+
+
+def coverage(
+    session: Session,
+    shifts: Optional[List[Tuple[object, time, time]]] = None,
+    now: Optional[datetime] = None,
+) -> StaffingReport:
+    """Coverage for `shifts` (day, start, end), or the stored WorkSchedule when None."""
+    if shifts is None:
+        shifts = session.exec(
+            select(WorkSchedule.day_of_week, WorkSchedule.start_time, WorkSchedule.end_time)
+        ).all()
+    staff = staff_on_duty(shifts)
+    orders = order_histogram(session, now or datetime.utcnow())
+    needed = np.ceil(orders / STAFFING_ORDERS_PER_BARISTA - 1e-9)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        load = np.where(staff > 0, orders / staff, np.nan)
+
+    slots = []
+    for b in range(BUCKETS):
+        day, minute = divmod(b * BUCKET_MINUTES, 24 * 60)
+        if staff[b] + 1e-9 < needed[b]:
+            status = "under"
+        elif staff[b] >= needed[b] + 1:
+            status = "over"
+        else:
+            status = "ok"
+        slots.append(StaffingSlot(
+            day_of_week=day + 1,
+            start=time(minute // 60, minute % 60),
+            staff=round(float(staff[b]), 3),
+            orders=round(float(orders[b]), 3),
+            orders_per_barista=None if math.isnan(load[b]) else round(float(load[b]), 3),
+            needed=int(needed[b]),
+            status=status,
+        ))
+    return StaffingReport(
+        bucket_minutes=BUCKET_MINUTES,
+        weeks=STAFFING_HISTORY_WEEKS,
+        orders_per_barista_capacity=STAFFING_ORDERS_PER_BARISTA,
+        understaffed=sum(s.status == "under" for s in slots),
+        overstaffed=sum(s.status == "over" for s in slots),
+        slots=slots,
+    )
@@ -0,0 +1,83 @@
+# tests/conftest.py
+#
+# Tests run against a throwaway SQLite database by default. Set
+# TEST_DATABASE_URL to an empty scratch Postgres database to run them (and
+# the Postgres-only plan tests) there. The tables are dropped and recreated
+# for every test, so never point it at real data.
+
+import os
+import sys
+import tempfile
+
+_workdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_workdir}/test.db")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("SQL_SLOW_MS", "1e9")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable
+
+import pytest
+from sqlmodel import Session, SQLModel
+
+import analytics
+import forecast
+from bom_cache import bom_cache
+from database import engine, init_db
+from ledger import ensure_ledger_head
+from metrics import RequestStats, current_request
+from models import InventoryItem, MenuItem, Recipe, RecipeIngredient
+from pricing import promotion_index
+
+
+def reset_schema():
+    """Drop and recreate every table, and empty the in-process caches."""
+    SQLModel.metadata.drop_all(engine)
+    init_db()
+    bom_cache.clear()
+    promotion_index.clear()
+    analytics.invalidate_all()
+    forecast.fits.clear()
+
+
+@pytest.fixture
+def session():
+    """A fresh schema with the ledger head, and a session on it."""
+    reset_schema()
+    with Session(engine) as session:
+        ensure_ledger_head(session)
+        session.commit()
+        yield session
+
+
+def add_menu(session: Session, recipes: Dict[str, Iterable[str]], stock: float = 1000.0,
+             price: float = 4.0, unit_cost: float = 0.5):
+    """Menu items whose recipes use one unit of each listed ingredient."""
+    ingredients = {name for names in recipes.values() for name in names}
+    for name in sorted(ingredients):
+        session.add(InventoryItem(name=name, unit="oz", price_per_unit=unit_cost, amount_in_stock=stock))
+    for item in recipes:
+        session.add(MenuItem(name=item, size_ounces=12, type="coffee", price=price, is_hot=True))
+    session.commit()
+    for item, names in recipes.items():
+        recipe = Recipe(menu_item_name=item)
+        session.add(recipe)
+        session.flush()
+        for name in names:
+            session.add(RecipeIngredient(recipe_id=recipe.recipe_id, inventory_item_name=name,
+                                         quantity=1, unit="oz"))
+    session.commit()
+
+
+@contextmanager
+def count_statements():
+    """Count SQL statements run inside the block, the way the request middleware does."""
+    stats = RequestStats()
+    stats.shapes = Counter()
+    token = current_request.set(stats)
+    try:
+        yield stats
+    finally:
+        current_request.reset(token)
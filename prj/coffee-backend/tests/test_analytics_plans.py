@@ -0,0 +1,103 @@
+# Plan regression test for the analytics queries. Postgres only: run with
+# TEST_DATABASE_URL pointing at an empty scratch database.
+#
+# The planner is left at its defaults. Three years of orders and rollup rows
+# are seeded and analyzed, then every query must reach its fact table
+# through the named index with its range predicate as the Index Cond. A
+# dropped index, or a predicate wrapped in a function, fails the test.
+
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, text
+from sqlmodel import Session
+
+from analytics import popular_stmt, revenue_stmt, top_revenue_stmt
+from conftest import reset_schema
+from database import engine
+from models import DailyItemSales, MenuItem, Order, OrderLineItem
+from rollup import rebuild_source
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name != "postgresql", reason="plan shapes are checked on Postgres only",
+)
+
+DAYS = 3 * 365
+MENU_ITEMS = 80
+ORDERS_PER_DAY = 200
+TODAY = date(2024, 12, 31)
+
+
+def _seed(session):
+    names = [f"drink {i}" for i in range(MENU_ITEMS)]
+    session.exec(insert(MenuItem), params=[
+        {"name": n, "size_ounces": 12, "type": "coffee", "price": 4.0, "is_hot": True} for n in names
+    ])
+    first = TODAY - timedelta(days=DAYS - 1)
+    session.exec(insert(DailyItemSales), params=[
+        {"sales_date": first + timedelta(days=d), "menu_item_name": n,
+         "quantity": 10, "revenue": 40.0, "ingredient_cost": 5.0}
+        for d in range(DAYS) for n in names
+    ])
+    start = datetime.combine(first, datetime.min.time())
+    step = timedelta(days=1) / ORDERS_PER_DAY
+    orders = [
+        {"order_id": i + 1, "timestamp": start + i * step, "payment_method": "cash"}
+        for i in range(DAYS * ORDERS_PER_DAY)
+    ]
+    for k in range(0, len(orders), 20000):
+        session.exec(insert(Order), params=orders[k:k + 20000])
+        session.exec(insert(OrderLineItem), params=[
+            {"order_id": o["order_id"], "menu_item_name": names[o["order_id"] % MENU_ITEMS],
+             "quantity": 1, "unit_price": 4.0, "unit_cost": 0.5}
+            for o in orders[k:k + 20000]
+        ])
+    session.commit()
+    for table in ('"order"', "order_line_item", "daily_item_sales"):
+        session.exec(text(f"ANALYZE {table}"))
+
+
+def _index_scans(plan: dict):
+    """(index name, index condition) for every index access in a JSON plan."""
+    if "Index Name" in plan:
+        yield plan["Index Name"], plan.get("Index Cond", "")
+    for child in plan.get("Plans", ()):
+        yield from _index_scans(child)
+
+
+def _plan(session, stmt) -> dict:
+    sql = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+    raw = session.exec(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar_one()
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+
+CASES = {
+    "revenue": (lambda: revenue_stmt(TODAY - timedelta(days=30), TODAY),
+                "daily_item_sales_pkey", "sales_date"),
+    "popular": (lambda: popular_stmt(TODAY.year, TODAY.month, 3),
+                "daily_item_sales_pkey", "sales_date"),
+    "top-revenue": (lambda: top_revenue_stmt(TODAY - timedelta(days=30), TODAY, 3),
+                    "daily_item_sales_pkey", "sales_date"),
+    "rollup-rebuild": (lambda: rebuild_source(TODAY - timedelta(days=1), TODAY),
+                       "ix_order_timestamp", "timestamp"),
+}
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    reset_schema()
+    with Session(engine) as session:
+        _seed(session)
+        yield session
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_analytics_query_uses_its_range_index(seeded, name):
+    build, index, column = CASES[name]
+    plan = _plan(seeded, build())
+    scans = list(_index_scans(plan))
+    assert any(i == index and column in cond for i, cond in scans), (
+        f"{name}: expected an Index Cond on {column} through {index}, got {scans or 'no index scans'}\n"
+        + json.dumps(plan, indent=1)
+    )
@@ -0,0 +1,50 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from auth import invalidate_principal, principal_cache
+from models import Manager
+
+SIGNUP = {"name": "Ann", "email": "ann@example.com", "salary": 20.0, "password": "pw"}
+BOB = {"ssn": "200", "name": "Bob", "email": "bob@example.com", "salary": 15.0, "password": "pw"}
+
+
+@pytest.fixture
+def client(session):
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _login(client, email: str) -> dict:
+    token = client.post("/token", data={"username": email, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_principal_cache_follows_employee_writes(client, session):
+    client.post("/signup", json={"ssn": "100", **SIGNUP})
+    ann = _login(client, "ann@example.com")
+    assert client.post("/employees/", json=BOB, headers=ann).status_code == 201
+    bob = _login(client, "bob@example.com")
+    me = client.get("/me", headers=bob).json()
+    assert (me["salary"], me["role"]) == (15.0, "barista")
+    assert principal_cache.get("bob@example.com").salary == 15.0  # served from the cache from here on
+
+    client.patch("/employees/200", json={"salary": 18.0}, headers=ann)
+    assert client.get("/me", headers=bob).json()["salary"] == 18.0
+
+    # no endpoint changes roles; whatever does must drop the entry the same way
+    session.add(Manager(ssn="200", ownership_percentage=0.0))
+    session.commit()
+    invalidate_principal("bob@example.com")
+    assert client.get("/me", headers=bob).json()["role"] == "manager"
+
+
+def test_deleted_employee_is_locked_out_on_the_next_request(client):
+    client.post("/signup", json={"ssn": "100", **SIGNUP})
+    ann = _login(client, "ann@example.com")
+    client.post("/employees/", json=BOB, headers=ann)
+    bob = _login(client, "bob@example.com")
+    assert client.get("/me", headers=bob).status_code == 200
+
+    assert client.delete("/employees/200", headers=ann).status_code == 204
+    assert client.get("/me", headers=bob).status_code == 401
@@ -0,0 +1,17 @@
+from sqlalchemy import update
+
+from bom_cache import BomCache
+from conftest import add_menu
+from models import RecipeIngredient
+
+
+def test_expired_bom_is_reloaded(session):
+    add_menu(session, {"latte": ("beans",)})
+    fresh, long_lived = BomCache(ttl=0), BomCache(ttl=3600)
+    assert fresh.get(session, "latte")[0].quantity == long_lived.get(session, "latte")[0].quantity == 1
+
+    # a recipe edit made by another worker invalidates nothing here
+    session.exec(update(RecipeIngredient).values(quantity=2))
+    session.commit()
+    assert long_lived.get(session, "latte")[0].quantity == 1
+    assert fresh.get(session, "latte")[0].quantity == 2
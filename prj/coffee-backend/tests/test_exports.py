@@ -0,0 +1,25 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from exports import export_accounting_entries
+from models import AccountingEntry
+
+
+def _body(response) -> list:
+    async def collect():
+        return [chunk async for chunk in response.body_iterator]
+    return [json.loads(line) for chunk in asyncio.run(collect()) for line in chunk.splitlines() if line]
+
+
+def test_aware_bounds_are_compared_in_utc(session):
+    for hour in range(6):
+        session.add(AccountingEntry(timestamp=datetime(2024, 1, 1, hour), delta=1, balance=hour + 1))
+    session.commit()
+
+    # 03:00-05:00 at UTC+2 is 01:00-03:00 UTC
+    shop = timezone(timedelta(hours=2))
+    rows = _body(export_accounting_entries(
+        "ndjson", datetime(2024, 1, 1, 3, tzinfo=shop), datetime(2024, 1, 1, 5, tzinfo=shop),
+    ))
+    assert [r["balance"] for r in rows] == [2, 3]
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+
+import forecast
+from conftest import count_statements
+from models import HourlyIngredientUsage
+
+NOW = datetime(2026, 10, 16, 14, 30)
+
+
+def _seed(session, days: int, ingredients: int, seed: int = 1):
+    """Usage from 06:00 to 20:00 every day; returns the rows."""
+    rng = np.random.default_rng(seed)
+    start = forecast.hour_of(NOW).replace(hour=0) - timedelta(days=days)
+    rows = [
+        {"hour": start + timedelta(days=d, hours=h), "inventory_item_name": f"ingredient {i}",
+         "quantity": float(rng.integers(1, 20))}
+        for d in range(days) for h in range(6, 21) for i in range(ingredients)
+    ]
+    for k in range(0, len(rows), 50000):
+        session.exec(insert(HourlyIngredientUsage), params=rows[k:k + 50000])
+    session.commit()
+    return rows
+
+
+def _reference_rates(rows, names):
+    """The fit computed row by row in Python."""
+    end = forecast.hour_of(NOW)
+    used = np.zeros((len(names), forecast.WEEK_HOURS))
+    exposure = np.zeros(forecast.WEEK_HOURS)
+    weight = lambda hour: 0.5 ** ((end - hour) / timedelta(days=1) / forecast.FORECAST_HALF_LIFE_DAYS)
+    slot = lambda hour: hour.weekday() * 24 + hour.hour
+    for r in rows:
+        if r["hour"] < end:
+            used[names.index(r["inventory_item_name"]), slot(r["hour"])] += r["quantity"] * weight(r["hour"])
+    hour = min(r["hour"] for r in rows)
+    while hour < end:
+        exposure[slot(hour)] += weight(hour)
+        hour += timedelta(hours=1)
+    return np.where(exposure > 0, used / np.where(exposure > 0, exposure, 1), 0.0)
+
+
+def test_fit_matches_row_by_row_decay(session):
+    rows = _seed(session, days=30, ingredients=3)
+    index, rates = forecast.fit_rates(session, NOW)
+    names = sorted(index, key=index.get)
+    assert names == [f"ingredient {i}" for i in range(3)]
+    np.testing.assert_allclose(rates, _reference_rates(rows, names), rtol=1e-9)
+
+
+def test_one_year_fit_reads_aggregates_not_rows(session, monkeypatch):
+    # a year of hours 06-20 for 4 ingredients: 21,900 usage rows, which the
+    # database must fold into at most 168 rows per ingredient
+    rows = _seed(session, days=365, ingredients=4)
+    fetched = []
+    exec_ = session.exec
+
+    def counting_exec(*args, **kwargs):
+        result = exec_(*args, **kwargs).all()
+        fetched.append(len(result))
+        return type("Rows", (), {"all": lambda self: result})()
+
+    monkeypatch.setattr(session, "exec", counting_exec)
+    with count_statements() as stats:
+        index, rates = forecast.fit_rates(session, NOW)
+    assert stats.statements == 1
+    assert fetched == [4 * 7 * 15]  # ingredients x weekdays x opening hours
+    assert len(rows) == 21900
+    assert rates.shape == (4, forecast.WEEK_HOURS)
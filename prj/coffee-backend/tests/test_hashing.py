@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import auth
+import main
+from hashing import HASH_RETRY_AFTER, HashPool
+
+SIGNUP = {"ssn": "100", "name": "Ann", "email": "ann@example.com", "salary": 20.0, "password": "pw"}
+
+
+@pytest.fixture
+def saturated():
+    """A pool with one worker and no queue, held busy until the test ends."""
+    pool, release = HashPool(workers=1, queue_size=0), threading.Event()
+    busy = pool.submit(release.wait)
+    yield pool
+    release.set()
+    busy.result()
+
+
+def test_full_pool_turns_work_away_with_retry_after(saturated):
+    with pytest.raises(HTTPException) as exc:
+        saturated.submit(len, "pw")
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == str(HASH_RETRY_AFTER)
+    assert saturated.stats()["rejected"] == 1
+
+
+def test_login_on_a_saturated_pool_is_a_503(session, saturated, monkeypatch):
+    with TestClient(main.app) as client:
+        assert client.post("/signup", json=SIGNUP).status_code == 201
+        monkeypatch.setattr(auth, "hash_pool", saturated)
+        r = client.post("/token", data={"username": "ann@example.com", "password": "pw"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == str(HASH_RETRY_AFTER)
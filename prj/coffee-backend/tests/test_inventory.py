@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+import inventory
+from conftest import add_menu
+from database import engine
+from models import InventoryItem, OrderCreate
+from orders import place_order
+
+ORDERS = 200
+STOCK = 50
+
+
+def _order(_):
+    with Session(engine) as session:
+        try:
+            place_order(session, OrderCreate(
+                payment_method="cash", items=[{"menu_item_name": "espresso", "quantity": 1}],
+            ))
+            return 200
+        except HTTPException as exc:
+            session.rollback()
+            return exc.status_code
+
+
+@pytest.mark.parametrize("policy", ["reject", "allow"])
+def test_parallel_orders_deduct_stock_exactly(session, monkeypatch, policy):
+    monkeypatch.setattr(inventory, "STOCK_POLICY", policy)
+    add_menu(session, {"espresso": ("beans",)}, stock=STOCK)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(_order, range(ORDERS)))
+
+    stock = session.exec(select(InventoryItem.amount_in_stock)).one()
+    if policy == "reject":
+        assert statuses.count(200) == STOCK
+        assert statuses.count(409) == ORDERS - STOCK
+        assert stock == 0
+    else:
+        assert statuses.count(200) == ORDERS
+        assert stock == STOCK - ORDERS
@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from conftest import add_menu
+from database import engine
+from ledger import balance_at, balance_history, current_balance, post_entry
+from models import AccountingEntry, OrderCreate
+from orders import place_order
+
+ORDERS = 100
+
+
+def _order(i):
+    with Session(engine) as session:
+        place_order(session, OrderCreate(
+            payment_method="cash", items=[{"menu_item_name": "latte", "quantity": 1 + i % 3}],
+        ))
+
+
+def test_concurrent_orders_keep_a_consistent_running_balance(session):
+    add_menu(session, {"latte": ("beans",)}, price=4.0, unit_cost=0.5)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(_order, range(ORDERS)))
+
+    entries = session.exec(select(AccountingEntry).order_by(AccountingEntry.entry_id)).all()
+    assert len(entries) == ORDERS
+    running = 0.0
+    for entry in entries:
+        running += entry.delta
+        assert entry.balance == running
+    expected = sum(3.5 * (1 + i % 3) for i in range(ORDERS))
+    assert current_balance(session) == running == expected
+
+
+START = datetime(2024, 3, 1, 6, 0)
+
+
+def _post_series(session) -> list:
+    """Entries at uneven times over three days, posted in time order; returns (timestamp, delta)."""
+    series = []
+    at = START
+    for i in range(120):
+        at += timedelta(minutes=17 + (i * 37) % 90)
+        delta = float((i * 7) % 11 - 5)
+        series.append((at, delta))
+        post_entry(session, delta, at)
+    session.commit()
+    return series
+
+
+def _naive_balance(series, at: datetime) -> float:
+    return sum(delta for ts, delta in series if ts <= at)
+
+
+def test_balance_at_matches_a_naive_sum(session):
+    series = _post_series(session)
+    instants = [START - timedelta(days=1), START, series[-1][0] + timedelta(days=1)]
+    for ts, _ in series[::7]:
+        hour = ts.replace(minute=0, second=0)
+        instants += [ts, ts - timedelta(seconds=1), hour, hour + timedelta(hours=1),
+                     hour.replace(hour=0)]
+    for at in instants:
+        assert balance_at(session, at) == _naive_balance(series, at), at
+
+
+def _naive_history(series, first: datetime, width: timedelta, unit: timedelta, end: datetime) -> list:
+    # checkpoints are whole units: the one holding the last instant before end counts in full
+    end = first + unit * -(-(end - first) // unit)
+    points = {}
+    balance = 0.0
+    for ts, delta in series:
+        before, balance = balance, balance + delta
+        if not first <= ts < end:
+            continue
+        i = (ts - first) // width
+        p = points.setdefault(i, {"start": first + i * width, "open": before, "low": before,
+                                  "high": before, "close": before, "entries": 0})
+        p["low"], p["high"] = min(p["low"], balance), max(p["high"], balance)
+        p["close"] = balance
+        p["entries"] += 1
+    return [points[i] for i in sorted(points)]
+
+
+@pytest.mark.parametrize("start, end, points, resolution, width", [
+    # 30 hours from the hour containing start, into 10 points: 3-hour buckets
+    (START + timedelta(hours=4, minutes=37), START + timedelta(hours=34), 10, "hour", timedelta(hours=3)),
+    # 30 h 37 min does not fit in 10 x 3 hours: widened to 4-hour buckets; the
+    # checkpoint holding `end` counts in full
+    (START + timedelta(hours=4), START + timedelta(hours=34, minutes=37), 10, "hour", timedelta(hours=4)),
+    # a whole number of hours per point
+    (START, START + timedelta(hours=24), 24, "hour", timedelta(hours=1)),
+    # three days into 2 points: buckets are at least a day, so daily checkpoints, two days wide
+    (START + timedelta(hours=5), START + timedelta(days=3), 2, "day", timedelta(days=2)),
+])
+def test_history_buckets(session, start, end, points, resolution, width):
+    series = _post_series(session)
+    history = balance_history(session, start, end, points)
+    assert history.resolution == resolution
+    unit = timedelta(hours=1) if resolution == "hour" else timedelta(days=1)
+    first = start.replace(minute=0) if resolution == "hour" else start.replace(hour=0, minute=0)
+    got = [p.model_dump() for p in history.points]
+    assert got == _naive_history(series, first, width, unit, end)
+    assert len(got) <= points + 1
+    assert all((p["start"] - first) % width == timedelta(0) for p in got)
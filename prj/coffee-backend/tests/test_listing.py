@@ -0,0 +1,85 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_engine
+from listing import NEXT_CURSOR_HEADER, ListParams, decode_cursor, list_page, list_params
+from models import AccountingEntry, Order, OrderLineItem
+
+
+def _cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", _cursor(7), _cursor({"order_id": 1}),
+                                    _cursor([1, 2]), _cursor("abc"), _cursor(["abc"]),
+                                    _cursor([1.5]), _cursor([True]), _cursor([[1]])])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, list(Order.__table__.primary_key.columns))
+    assert exc.value.status_code == 400
+
+
+def test_cursor_values_come_back_as_column_types():
+    keys = list(OrderLineItem.__table__.primary_key.columns)
+    assert decode_cursor(_cursor([3, "latte"]), keys) == [3, "latte"]
+    with pytest.raises(HTTPException):
+        decode_cursor(_cursor(["3", "latte"]), keys)
+    with pytest.raises(HTTPException):
+        decode_cursor(_cursor([3, 4]), keys)
+
+
+def test_forged_cursor_is_a_400_from_the_listing(session):
+    async def run():
+        async with AsyncSession(async_engine) as s:
+            params = ListParams(cursor=_cursor(["abc"]), limit=10, order="asc", fields=None, start=None, end=None)
+            return await list_page(s, Order, params)
+    with pytest.raises(HTTPException) as exc:
+        try:
+            asyncio.run(run())
+        finally:
+            asyncio.run(async_engine.dispose())
+    assert exc.value.status_code == 400
+
+
+def _pages(model, order: str, limit: int) -> list:
+    async def run():
+        pages, cursor = [], None
+        async with AsyncSession(async_engine) as session:
+            while True:
+                params = ListParams(cursor=cursor, limit=limit, order=order, fields=None, start=None, end=None)
+                resp = await list_page(session, model, params)
+                pages.append(json.loads(resp.body))
+                cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+                if cursor is None:
+                    return pages
+    try:
+        return asyncio.run(run())
+    finally:
+        asyncio.run(async_engine.dispose())
+
+
+def test_descending_pages_start_from_the_newest_row(session):
+    start = datetime(2024, 1, 1)
+    for i in range(7):
+        session.add(AccountingEntry(timestamp=start + timedelta(hours=i), delta=1, balance=i + 1))
+    session.commit()
+
+    pages = _pages(AccountingEntry, "desc", 3)
+    assert [len(p) for p in pages] == [3, 3, 1]
+    balances = [row["balance"] for page in pages for row in page]
+    assert balances == [7, 6, 5, 4, 3, 2, 1]
+    ascending = [row["balance"] for page in _pages(AccountingEntry, "asc", 3) for row in page]
+    assert ascending == balances[::-1]
+
+
+def test_aware_time_filters_are_converted_to_utc():
+    shop = timezone(timedelta(hours=2))
+    params = list_params(cursor=None, limit=10, order="asc", fields=None,
+                         start=datetime(2024, 1, 1, 3, tzinfo=shop), end=None)
+    assert params.start == datetime(2024, 1, 1, 1)
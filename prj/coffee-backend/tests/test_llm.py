@@ -0,0 +1,86 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import llm
+import llm_stub
+from database import async_engine
+from models import DrinkDescription
+
+
+class TimedASGITransport(httpx.ASGITransport):
+    """ASGITransport that honours the client's read timeout, as a socket would."""
+
+    async def handle_async_request(self, request):
+        timeout = request.extensions.get("timeout", {}).get("read")
+        try:
+            return await asyncio.wait_for(super().handle_async_request(request), timeout)
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout("stub took too long", request=request)
+
+
+@pytest.fixture
+def stub(session, monkeypatch):
+    monkeypatch.setattr(llm_stub.app.state, "calls", 0)
+    llm.use_transport(TimedASGITransport(app=llm_stub.app))
+    yield llm_stub.app.state
+    llm.use_transport(None)
+
+
+def _run(*calls):
+    """Run describe() calls concurrently on a fresh client; returns the results or exceptions."""
+    async def run():
+        async def one(drink, refresh=False):
+            async with AsyncSession(async_engine) as s:
+                return await llm.describe(s, drink, refresh)
+        try:
+            return await asyncio.gather(*(one(*c) for c in calls), return_exceptions=True)
+        finally:
+            await llm.close()
+            await async_engine.dispose()
+    return asyncio.run(run())
+
+
+def _stored(session):
+    return sorted(session.exec(select(DrinkDescription.drink)).all())
+
+
+def test_concurrent_requests_share_one_generation(stub, monkeypatch):
+    monkeypatch.setattr(llm_stub, "LLM_STUB_DELAY", 0.05)
+    out = _run(*[("mocha",)] * 5)
+    assert stub.calls == 1
+    assert len(set(out)) == 1 and "mocha" in out[0]
+
+
+def test_stored_description_is_served_without_a_call(stub, session):
+    first, = _run(("mocha",))
+    again, = _run(("mocha",))
+    assert again == first
+    assert stub.calls == 1
+    assert _stored(session) == ["mocha"]
+
+
+def test_refresh_regenerates(stub, session):
+    _run(("mocha",))
+    _run(("mocha", True))
+    assert stub.calls == 2
+    assert session.exec(select(func.count()).select_from(DrinkDescription)).one() == 1
+
+
+def test_least_recently_used_rows_are_evicted(stub, session, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_CACHE_MAX_ROWS", 2)
+    for drink in ("latte", "mocha", "tea"):
+        _run((drink,))
+    assert _stored(session) == ["mocha", "tea"]
+
+
+def test_stub_timeout_is_a_504(stub, session, monkeypatch):
+    monkeypatch.setattr(llm_stub, "LLM_STUB_DELAY", 1.0)
+    monkeypatch.setattr(llm, "LLM_TIMEOUT", 0.05)
+    out, = _run(("mocha",))
+    assert isinstance(out, HTTPException) and out.status_code == 504
+    assert _stored(session) == []
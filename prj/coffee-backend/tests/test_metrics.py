@@ -0,0 +1,38 @@
+import re
+
+from fastapi.testclient import TestClient
+
+import main
+from conftest import add_menu
+from metrics import RouteMetrics
+from query_budget import BUDGETS
+
+SIGNUP = {"ssn": "100", "name": "Ann", "email": "ann@example.com", "salary": 20.0, "password": "pw"}
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    wanted = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    match = re.search(rf"^{name}\{{{re.escape(wanted)}\}} (\S+)$", text, re.MULTILINE)
+    assert match, f"no {name}{{{wanted}}} sample"
+    return float(match.group(1))
+
+
+def test_metrics_report_the_sql_an_order_ran(session, monkeypatch):
+    monkeypatch.setattr(main, "route_metrics", RouteMetrics())
+    add_menu(session, {"latte": ("beans", "milk")})
+    with TestClient(main.app) as client:
+        client.post("/signup", json=SIGNUP)
+        token = client.post("/token", data={"username": "ann@example.com", "password": "pw"}).json()["access_token"]
+        r = client.post("/orders/", headers={"Authorization": f"Bearer {token}"},
+                        json={"payment_method": "cash", "items": [{"menu_item_name": "latte", "quantity": 1}]})
+        assert r.status_code == 200
+        text = client.get("/metrics").text
+
+    order = {"method": "POST", "route": "/orders/"}
+    assert _sample(text, "coffee_http_requests_total", **order, status=200) == 1
+    assert _sample(text, "coffee_http_request_sql_statements_count", **order) == 1
+    statements = _sample(text, "coffee_http_request_sql_statements_sum", **order)
+    assert 0 < statements <= BUDGETS[("POST", "/orders/")]
+    assert _sample(text, "coffee_http_request_sql_statements_bucket", **order, le=0) == 0
+    assert _sample(text, "coffee_http_request_sql_statements_bucket", **order, le="+Inf") == 1
+    assert _sample(text, "coffee_http_request_sql_seconds_total", **order) > 0
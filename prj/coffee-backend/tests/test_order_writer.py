@@ -0,0 +1,40 @@
+from fastapi import HTTPException
+from sqlmodel import func, select
+
+import inventory
+from conftest import add_menu
+from models import InventoryItem, Order, OrderCreate, OrderRead
+from order_writer import write_group
+
+
+def _ticket(name: str, quantity: int = 1) -> OrderCreate:
+    return OrderCreate(payment_method="cash", items=[{"menu_item_name": name, "quantity": quantity}])
+
+
+def _status(outcome):
+    return 200 if isinstance(outcome, OrderRead) else outcome.status_code
+
+
+def test_invalid_tickets_fail_alone_without_a_rollback(session, monkeypatch):
+    add_menu(session, {"latte": ("beans",)})
+    rollbacks = []
+    monkeypatch.setattr(session, "rollback", lambda: rollbacks.append(1))
+    group = [_ticket("latte"), _ticket("unicorn frappe"), _ticket("latte", 0), _ticket("latte")]
+
+    outcomes = write_group(session, group)
+    assert [_status(o) for o in outcomes] == [200, 404, 400, 200]
+    assert all(isinstance(o, HTTPException) for o in outcomes[1:3])
+    assert outcomes[0].order_id < outcomes[3].order_id
+    assert not rollbacks
+    assert session.exec(select(func.count()).select_from(Order)).one() == 2
+
+
+def test_stock_rejection_replays_the_rest_of_the_group(session, monkeypatch):
+    monkeypatch.setattr(inventory, "STOCK_POLICY", "reject")
+    add_menu(session, {"latte": ("beans",)}, stock=3)
+    group = [_ticket("latte"), _ticket("latte", 5), _ticket("latte"), _ticket("latte")]
+
+    outcomes = write_group(session, group)
+    assert [_status(o) for o in outcomes] == [200, 409, 200, 200]
+    assert session.exec(select(func.count()).select_from(Order)).one() == 3
+    assert session.exec(select(InventoryItem.amount_in_stock)).one() == 0
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlmodel import func, select
+
+from bom_cache import bom_cache
+from conftest import add_menu, count_statements
+from models import BatchOrder, DailyItemSales, InventoryItem, Order, OrderCreate, OrderLineItem
+from orders import place_order, place_order_batch
+from pricing import promotion_index
+
+
+def _ticket(lines: int) -> OrderCreate:
+    return OrderCreate(
+        payment_method="cash",
+        items=[{"menu_item_name": f"drink {i}", "quantity": 1 + i % 3} for i in range(lines)],
+    )
+
+
+def test_place_order_query_count_does_not_grow_with_lines(session):
+    add_menu(session, {f"drink {i}": ("beans", "milk", f"syrup {i}") for i in range(10)})
+    counts = {}
+    for lines in (1, 3, 10):
+        # cold caches: the worst case, as in the query budgets
+        bom_cache.clear()
+        promotion_index.clear()
+        with count_statements() as stats:
+            place_order(session, _ticket(lines))
+        counts[lines] = stats.statements
+    assert counts[1] > 0
+    assert counts[1] == counts[3] == counts[10], counts
+
+
+def test_resent_batch_is_not_applied_twice(session):
+    add_menu(session, {"latte": ("beans",)}, stock=100)
+    now = datetime.utcnow()
+    batch = [
+        BatchOrder(payment_method="cash", client_ref=ref, client_timestamp=now,
+                   items=[{"menu_item_name": "latte", "quantity": 1}])
+        for ref in ("a", "b", "a")
+    ]
+    first = place_order_batch(session, batch)
+    assert (first.accepted, first.duplicates, first.rejected) == (2, 1, 0)
+    assert first.results[2].order_id == first.results[0].order_id
+
+    again = place_order_batch(session, batch)
+    assert (again.accepted, again.duplicates, again.rejected) == (0, 3, 0)
+    assert [r.order_id for r in again.results] == [r.order_id for r in first.results]
+    assert session.exec(select(func.count()).select_from(Order)).one() == 2
+    assert session.exec(select(InventoryItem.amount_in_stock)).one() == 98
+
+
+def test_lines_are_costed_at_the_prices_the_stock_update_locked(session):
+    add_menu(session, {"latte": ("beans", "milk")}, unit_cost=0.5)
+    bom_cache.get(session, "latte")  # warm: nothing below invalidates it
+    session.exec(update(InventoryItem).where(InventoryItem.name == "beans").values(price_per_unit=0.75))
+    session.commit()
+
+    place_order(session, OrderCreate(payment_method="cash", items=[{"menu_item_name": "latte", "quantity": 2}]))
+    place_order_batch(session, [BatchOrder(payment_method="cash", client_timestamp=datetime.utcnow(),
+                                           items=[{"menu_item_name": "latte", "quantity": 1}])])
+    assert session.exec(select(OrderLineItem.unit_cost)).all() == [1.25, 1.25]
+    assert session.exec(select(DailyItemSales.ingredient_cost)).one() == 3 * 1.25
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import select
+
+from conftest import add_menu, count_statements
+from models import OrderCreate, OrderLineItem, Promotion, PromotionItem
+from orders import place_order
+from pricing import PROMOTION_INDEX_LOOKBACK_DAYS, promotion_index
+
+
+def _promote(session, name: str, start: datetime, end: datetime, price: float):
+    promo = Promotion(start_time=start, end_time=end, discounted_price=price)
+    session.add(promo)
+    session.flush()
+    session.add(PromotionItem(promotion_id=promo.promotion_id, menu_item_name=name))
+    session.commit()
+
+
+def test_reload_skips_long_ended_promotions(session):
+    add_menu(session, {"latte": ("beans",), "mocha": ("beans",), "tea": ("leaves",)}, price=4.0)
+    now = datetime.utcnow()
+    long_ago = now - timedelta(days=PROMOTION_INDEX_LOOKBACK_DAYS + 30)
+    _promote(session, "latte", long_ago, long_ago + timedelta(days=1), 1.0)
+    _promote(session, "mocha", now - timedelta(days=2), now - timedelta(days=1), 2.0)
+    _promote(session, "tea", now - timedelta(hours=1), now + timedelta(days=1), 3.0)
+    promotion_index.reload(session)
+
+    assert promotion_index.price("latte", long_ago + timedelta(hours=1), 4.0) == 4.0  # not loaded
+    assert promotion_index.price("mocha", now - timedelta(days=1, hours=1), 4.0) == 2.0
+    assert promotion_index.price("mocha", now, 4.0) == 4.0
+    assert promotion_index.price("tea", now, 4.0) == 3.0
+
+
+def test_orders_read_the_index_without_reloading(session):
+    add_menu(session, {"latte": ("beans",)}, price=4.0)
+    now = datetime.utcnow()
+    _promote(session, "latte", now - timedelta(hours=1), now + timedelta(hours=1), 2.5)
+    promotion_index.reload(session)
+    with count_statements() as stats:
+        place_order(session, OrderCreate(payment_method="cash", items=[{"menu_item_name": "latte", "quantity": 2}]))
+    assert session.exec(select(OrderLineItem.unit_price)).one() == 2.5
+    assert not any("promotion" in statement for statement in stats.shapes)
@@ -0,0 +1,13 @@
+import llm
+import query_budget
+from conftest import reset_schema
+
+
+def test_every_route_stays_within_its_query_budget(capsys):
+    reset_schema()
+    try:
+        failed = query_budget.run_harness(strict=True)
+    finally:
+        llm.use_transport(None)
+    out = capsys.readouterr().out
+    assert failed == 0, "\n".join(line for line in out.splitlines() if line.startswith("FAIL"))
@@ -0,0 +1,53 @@
+import asyncio
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import recommender
+from conftest import add_menu, count_statements
+from database import async_engine
+from models import OrderCreate
+from orders import place_order
+
+
+def test_suggest_reads_the_matrix_without_refreshing(session, monkeypatch):
+    add_menu(session, {"latte": ("beans", "milk"), "croissant": ("flour",), "tea": ("leaves",)})
+    for _ in range(5):
+        place_order(session, OrderCreate(payment_method="cash", items=[
+            {"menu_item_name": "latte", "quantity": 1}, {"menu_item_name": "croissant", "quantity": 1},
+        ]))
+    place_order(session, OrderCreate(payment_method="cash", items=[{"menu_item_name": "tea", "quantity": 1}]))
+    matrix = recommender.CoOccurrence()
+    monkeypatch.setattr(recommender, "co_occurrence", matrix)
+    monkeypatch.setattr(recommender, "RECOMMENDER_MIN_SUPPORT", 3)
+    matrix.refresh(full=True)
+    monkeypatch.setattr(matrix, "refresh", lambda *a, **k: (_ for _ in ()).throw(AssertionError("refreshed")))
+
+    async def run():
+        async with AsyncSession(async_engine) as s:
+            with count_statements() as stats:
+                out = await recommender.suggest(s, ["latte"])
+        await async_engine.dispose()
+        return out, stats
+
+    out, stats = asyncio.run(run())
+    assert out[0].startswith("croissant")
+    assert not any("order_line_item" in statement for statement in stats.shapes)
+    assert stats.statements <= 2  # BOMs and stock
+
+
+def test_refresh_publishes_a_new_matrix_and_leaves_the_old_one_whole(session):
+    add_menu(session, {"latte": ("beans",), "croissant": ("flour",), "tea": ("leaves",)})
+    place_order(session, OrderCreate(payment_method="cash", items=[{"menu_item_name": "latte", "quantity": 1}]))
+    matrix = recommender.CoOccurrence()
+    matrix.refresh(full=True)
+    before = matrix.matrix
+
+    place_order(session, OrderCreate(payment_method="cash", items=[
+        {"menu_item_name": "croissant", "quantity": 1}, {"menu_item_name": "tea", "quantity": 1},
+    ]))
+    assert matrix.refresh() == 1
+    after = matrix.matrix
+    assert after is not before
+    # a reader still holding the old snapshot sees it unchanged and consistent
+    assert before.names == ["latte"] and before.lift.shape == before.counts.shape == (1, 1)
+    assert len(after.names) == len(after.index) == after.lift.shape[0] == after.counts.shape[0] == 3
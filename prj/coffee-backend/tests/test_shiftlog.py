@@ -0,0 +1,66 @@
+from datetime import date, datetime, timedelta
+
+from models import Employee, EventType, ShiftLog
+from shiftlog import payroll
+
+DAY = date(2024, 3, 6)
+MIDNIGHT = datetime(2024, 3, 6)
+
+
+def _staff(session, shifts):
+    """shifts: ssn -> [(event type, hours after DAY's midnight)]; everyone earns 10/hour."""
+    for ssn, events in shifts.items():
+        session.add(Employee(ssn=ssn, name=ssn, email=f"{ssn}@example.com", password_hash="-", salary=10.0))
+        session.flush()
+        for event_type, hours in events:
+            session.add(ShiftLog(ssn=ssn, event_type=event_type, timestamp=MIDNIGHT + timedelta(hours=hours)))
+    session.commit()
+
+
+IN, OUT = EventType.clock_in, EventType.clock_out
+
+
+def _lines(session, start=DAY, end=DAY):
+    return {line.ssn: (line.hours, line.shifts, line.unpaired_clock_ins, line.cost)
+            for line in payroll(session, start, end)}
+
+
+def test_shifts_are_clipped_at_the_period_edges(session):
+    _staff(session, {
+        "day": [(IN, 9), (OUT, 17)],
+        "overnight-in": [(IN, -2), (OUT, 2)],    # from the evening before
+        "overnight-out": [(IN, 20), (OUT, 28)],  # into the next morning
+        "outside": [(IN, -10), (OUT, -4)],
+    })
+    lines = _lines(session)
+    assert lines["day"] == (8.0, 1, 0, 80.0)
+    assert lines["overnight-in"] == (2.0, 1, 0, 20.0)
+    assert lines["overnight-out"] == (4.0, 1, 0, 40.0)
+    assert lines["outside"] == (0.0, 0, 0, 0.0)
+
+    # over two days the overnight shift is paid once, in full
+    assert _lines(session, DAY, DAY + timedelta(days=1))["overnight-out"] == (8.0, 1, 0, 80.0)
+
+
+def test_unpaired_and_overlong_clock_ins_are_reported_not_paid(session):
+    _staff(session, {
+        "forgot-out": [(IN, 8), (IN, 12), (OUT, 15)],  # the 08:00 clock-in has no clock-out
+        "too-long": [(IN, 6), (OUT, 6 + 17)],          # over PAYROLL_MAX_SHIFT_HOURS
+        "never-out": [(IN, 10)],
+        "idle": [],
+    })
+    lines = _lines(session)
+    assert lines["forgot-out"] == (3.0, 1, 1, 30.0)
+    assert lines["too-long"] == (0.0, 0, 1, 0.0)
+    assert lines["never-out"] == (0.0, 0, 1, 0.0)
+    assert lines["idle"] == (0.0, 0, 0, 0.0)
+
+
+def test_open_shift_is_neither_paid_nor_unpaired(session):
+    now = datetime.utcnow()
+    session.add(Employee(ssn="on", name="on", email="on@example.com", password_hash="-", salary=10.0))
+    session.flush()
+    session.add(ShiftLog(ssn="on", event_type=IN, timestamp=now - timedelta(hours=1)))
+    session.commit()
+    line, = payroll(session, (now - timedelta(days=1)).date(), now.date())
+    assert (line.hours, line.shifts, line.unpaired_clock_ins) == (0.0, 0, 0)
@@ -0,0 +1,55 @@
+from datetime import time
+
+import numpy as np
+import pytest
+
+from staffing import BUCKET_MINUTES, BUCKETS, day_index, staff_on_duty
+
+DAY_BUCKETS = 24 * 60 // BUCKET_MINUTES
+
+
+def _bucket(day: int, hour: int, minute: int = 0) -> int:
+    """Bucket index for a day (0 = Monday) and a time."""
+    return day * DAY_BUCKETS + (hour * 60 + minute) // BUCKET_MINUTES
+
+
+def test_day_shift_covers_its_buckets_only():
+    staff = staff_on_duty([(1, time(7), time(15))])
+    on = np.zeros(BUCKETS)
+    on[_bucket(0, 7):_bucket(0, 15)] = 1
+    np.testing.assert_array_equal(staff, on)
+
+
+def test_shift_past_midnight_runs_into_the_next_day():
+    staff = staff_on_duty([("wed", time(22), time(2))])
+    assert staff[_bucket(2, 21, 45)] == 0
+    assert staff[_bucket(2, 22)] == staff[_bucket(3, 1, 45)] == 1
+    assert staff[_bucket(3, 2)] == 0
+    assert staff.sum() * BUCKET_MINUTES == 4 * 60
+
+
+def test_sunday_night_shift_wraps_to_monday_morning():
+    staff = staff_on_duty([(7, time(22), time(2))])
+    assert staff[_bucket(6, 22)] == staff[BUCKETS - 1] == 1
+    assert staff[_bucket(0, 0)] == staff[_bucket(0, 1, 45)] == 1
+    assert staff[_bucket(0, 2)] == 0
+    assert staff.sum() * BUCKET_MINUTES == 4 * 60
+
+
+def test_partial_buckets_are_weighted_by_minutes_on_duty():
+    staff = staff_on_duty([(2, time(9, 5), time(9, 40)), (2, time(9, 0), time(9, 15))])
+    assert staff[_bucket(1, 9)] == pytest.approx(1 + 10 / 15)  # 09:00-09:15 plus 09:05-09:15
+    assert staff[_bucket(1, 9, 15)] == 1
+    assert staff[_bucket(1, 9, 30)] == pytest.approx(10 / 15)
+    assert staff[_bucket(1, 9, 45)] == 0
+
+
+def test_end_equal_to_start_is_a_24_hour_shift():
+    staff = staff_on_duty([("sun", time(12), time(12))])
+    assert staff.sum() * BUCKET_MINUTES == 24 * 60
+    assert staff[_bucket(0, 11, 45)] == 1 and staff[_bucket(0, 12)] == 0
+
+
+@pytest.mark.parametrize("day, index", [(1, 0), ("7", 6), ("Monday", 0), ("sun", 6)])
+def test_day_names_and_numbers(day, index):
+    assert day_index(day) == index
@@ -0,0 +1,13 @@
+# timeutil.py
+#
+# Timestamps are stored as naive UTC. Aware values coming in from clients
+# (ISO strings with an offset) are converted at the edge.
+
+from datetime import datetime, timezone
+
+
+def utc_naive(ts: datetime) -> datetime:
+    """`ts` as naive UTC; naive values are taken to be UTC already."""
+    if ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
@@ -21,7 +21,8 @@ function AccountingEntriesPage() {
 
   useEffect(() => {
     api
-      .get<AccountingEntry[]>("/accounting_entries")
+      // newest first; the ledger grows without bound, so only the latest page
+      .get<AccountingEntry[]>("/accounting_entries", { params: { order: "desc", limit: 500 } })
       .then((r) => setEntries(r.data))
       .catch(() => setError("Could not load accounting"))
       .finally(() => setLoading(false));
@@ -3,7 +3,7 @@
 import React, { useState, useEffect } from "react";
 import { useRouter } from "next/router";
 import withAuth from "../utils/withAuth";
-import api from "../services/api";
+import api, { listAll } from "../services/api";
 import { requireManager } from "../utils/requireManager";
 
 interface Employee {
@@ -22,7 +22,7 @@ function EmployeesPage() {
   const fetchEmployees = async () => {
     setLoading(true);
     try {
-      const { data } = await api.get<Employee[]>("/employees");
+      const data = await listAll<Employee>("/employees");
       setEmployees(data);
     } catch (err: any) {
       setError(err.response?.data?.detail || "Could not load employees");
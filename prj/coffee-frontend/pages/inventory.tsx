@@ -2,7 +2,7 @@
 
 import { useEffect, useState } from "react";
 import { useRouter } from "next/router";
-import api from "../services/api";
+import api, { listAll } from "../services/api";
 import withAuth from "../utils/withAuth";
 import { useAuth } from "../contexts/AuthContext";
 import { requireManager } from "../utils/requireManager";
@@ -25,7 +25,7 @@ function InventoryItemsPage() {
   const fetchItems = async () => {
     setLoading(true);
     try {
-      const { data } = await api.get<InventoryItem[]>("/inventory_items");
+      const data = await listAll<InventoryItem>("/inventory_items");
       setItems(data);
     } catch (err: any) {
       setError(err.response?.data?.detail || "Failed to load inventory");
@@ -4,7 +4,7 @@ import React, { useState, useEffect } from "react";
 import { Plus, Edit3, Trash2, Coffee } from "lucide-react";
 import withAuth from "../utils/withAuth";
 import { requireManager } from "../utils/requireManager";
-import api from "../services/api";
+import api, { listAll } from "../services/api";
 import { useRouter } from "next/router";
 
 interface MenuItem {
@@ -25,7 +25,7 @@ function MenuItemsPage() {
   const fetchItems = async () => {
     setLoading(true);
     try {
-      const { data } = await api.get<MenuItem[]>('/menu_items');
+      const data = await listAll<MenuItem>('/menu_items');
       setItems(data);
     } catch {
       setError('Could not load menu');
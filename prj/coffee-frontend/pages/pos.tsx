@@ -3,7 +3,7 @@
 
 import { useEffect, useState } from "react";
 import { useRouter } from "next/router";
-import api from "../services/api";
+import api, { listAll } from "../services/api";
 import withAuth from "../utils/withAuth";
 import { useAuth } from "../contexts/AuthContext";
 
@@ -21,7 +21,7 @@ export default withAuth(function PosPage() {
   const [showSuggestions, setShowSuggestions] = useState(false);
 
   useEffect(() => {
-    api.get<MenuItem[]>("/menu_items").then(r => setMenu(r.data));
+    listAll<MenuItem>("/menu_items").then(setMenu);
   }, []);
 
   const addToCart = (item: MenuItem) => {
@@ -12,4 +12,17 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
-export default api;
\ No newline at end of file
+// List endpoints return one page per request (500 rows unless `limit` is
+// given) and put the cursor for the next page in the X-Next-Cursor header.
+export async function listAll<T>(path: string, params: Record<string, unknown> = {}): Promise<T[]> {
+  const rows: T[] = [];
+  let cursor: string | undefined;
+  do {
+    const resp = await api.get<T[]>(path, { params: { ...params, limit: 5000, cursor } });
+    rows.push(...resp.data);
+    cursor = resp.headers["x-next-cursor"];
+  } while (cursor);
+  return rows;
+}
+
+export default api;